@@ -1,6 +1,9 @@
 import random
 
-import pgzrun
+import pygame
+from pygame.constants import K_UP, K_SPACE, K_DOWN, K_LEFT, K_RIGHT
+
+import board
 
 piece_structures = [
     [
@@ -141,191 +144,352 @@ grid_y_count = 18
 
 timer_limit = 0.5
 
-
-def new_sequence():
-    global sequence
-
-    sequence = list(range(len(piece_structures)))
-    random.shuffle(sequence)
-
-
-def new_piece():
-    global piece_x
-    global piece_y
-    global piece_type
-    global piece_rotation
-
-    piece_x = 3
-    piece_y = 0
-    piece_type = sequence.pop()
-    if len(sequence) == 0:
-        new_sequence()
-    piece_rotation = 0
-
-
-def reset():
-    global inert
-    global timer
-
-    inert = []
-    for y in range(grid_y_count):
-        inert.append([])
-        for x in range(grid_x_count):
-            inert[y].append(" ")
-
-    timer = 0
-    new_sequence()
-    new_piece()
-
-
-reset()
-
-
-def can_piece_move(test_x, test_y, test_rotation):
+block_size = 20
+block_colors = {
+    " ": (222, 222, 222),
+    "i": (120, 195, 239),
+    "j": (236, 231, 108),
+    "l": (124, 218, 193),
+    "o": (234, 177, 121),
+    "s": (211, 136, 236),
+    "t": (248, 147, 196),
+    "z": (169, 221, 118),
+    "preview": (190, 190, 190),
+}
+background_color = (255, 255, 255)
+
+wall_width = 4  # Always filled columns on both sides of a row mask
+
+
+def compile_piece(structure):
+    # Row masks of the non-empty rows as (y, mask), the lowest block of every
+    # non-empty column as (x, y), and all blocks as (x, y)
+    rows = []
     for y in range(piece_y_count):
+        mask = 0
         for x in range(piece_x_count):
-            test_block_x = test_x + x
-            test_block_y = test_y + y
-
-            if (
-                    piece_structures[piece_type][test_rotation][y][x] != " " and (
-                    test_block_x < 0
-                    or test_block_x >= grid_x_count
-                    or test_block_y >= grid_y_count
-                    or inert[test_block_y][test_block_x] != " "
-            )
-            ):
-                return False
+            if structure[y][x] != " ":
+                mask |= 1 << x
+        if mask:
+            rows.append((y, mask))
+    bottoms = []
+    for x in range(piece_x_count):
+        for y in range(piece_y_count - 1, -1, -1):
+            if structure[y][x] != " ":
+                bottoms.append((x, y))
+                break
+    blocks = tuple(
+        (x, y) for y in range(piece_y_count) for x in range(piece_x_count)
+        if structure[y][x] != " "
+    )
+    return tuple(rows), tuple(bottoms), blocks
+
+
+piece_masks = [
+    [compile_piece(structure) for structure in rotations]
+    for rotations in piece_structures
+]
 
-    return True
+
+class TetrisBoard:
+    # Block letters of the locked pieces are kept in cells, and mirrored as
+    # int bitmasks for fast tests: rows[y] has bit x + wall_width set when
+    # column x is filled, columns[x] has bit y set when row y is filled.
+
+    def __init__(self, col_count=grid_x_count, row_count=grid_y_count):
+        self.col_count = col_count
+        self.row_count = row_count
+        walls = (1 << wall_width) - 1
+        # The wall bits on both sides are always set, so a piece that sticks
+        # out of the board collides like it hits a block
+        self.empty_mask = walls | (walls << (wall_width + col_count))
+        self.full_mask = (1 << (col_count + 2 * wall_width)) - 1
+        self.version = 0  # Changes whenever blocks are added or removed
+        self.reset()
+
+    def reset(self):
+        self.version += 1
+        self.cells = [[" "] * self.col_count for _ in range(self.row_count)]
+        # Full rows below the board stand for the floor
+        self.rows = (
+            [self.empty_mask] * self.row_count
+            + [self.full_mask] * piece_y_count
+        )
+        # Bit row_count of every column is the floor
+        self.columns = [1 << self.row_count] * self.col_count
+
+    def copy(self, with_cells=True):
+        # A copy without cells only keeps the masks, which is all that
+        # collides, drop_y, place_piece and clear_lines need
+        other = TetrisBoard.__new__(TetrisBoard)
+        other.col_count = self.col_count
+        other.row_count = self.row_count
+        other.empty_mask = self.empty_mask
+        other.full_mask = self.full_mask
+        other.rows = self.rows[:]
+        other.columns = self.columns[:]
+        other.version = self.version
+        other.cells = None
+        if with_cells and self.cells is not None:
+            other.cells = [row[:] for row in self.cells]
+        return other
+
+    def collides(self, piece, x, y):
+        # piece is one rotation from piece_masks
+        shift = x + wall_width
+        rows = self.rows
+        for dy, mask in piece[0]:
+            if rows[y + dy] & (mask << shift):
+                return True
+        return False
+
+    def drop_y(self, piece, x, y):
+        # Lowest row a piece at a free position can fall to, found from the
+        # first filled cell below each of its columns
+        landing_y = self.row_count
+        for dx, dy in piece[1]:
+            top = y + dy + 1
+            below = self.columns[x + dx] >> top
+            first = (below & -below).bit_length() - 1 + top
+            landing_y = min(landing_y, first - 1 - dy)
+        return landing_y
+
+    def place(self, structure, x, y):
+        # Copy the blocks of a piece into the board
+        self.version += 1
+        for dy in range(piece_y_count):
+            for dx in range(piece_x_count):
+                block = structure[dy][dx]
+                if block != " ":
+                    self.cells[y + dy][x + dx] = block
+                    self.rows[y + dy] |= 1 << (x + dx + wall_width)
+                    self.columns[x + dx] |= 1 << (y + dy)
+
+    def place_piece(self, piece, x, y):
+        # Only update the masks, for boards copied without cells
+        self.version += 1
+        shift = x + wall_width
+        for dy, mask in piece[0]:
+            self.rows[y + dy] |= mask << shift
+        for dx, dy in piece[2]:
+            self.columns[x + dx] |= 1 << (y + dy)
+
+    def clear_lines(self):
+        # Drop the complete rows and put empty ones on top in one pass,
+        # return the indices the cleared rows had before
+        row_count, full_mask = self.row_count, self.full_mask
+        cleared = [y for y in range(row_count) if self.rows[y] == full_mask]
+        if not cleared:
+            return cleared
+        self.version += 1
+        kept = [y for y in range(row_count) if self.rows[y] != full_mask]
+        if self.cells is not None:
+            empty = [[" "] * self.col_count for _ in cleared]
+            self.cells = empty + [self.cells[y] for y in kept]
+        self.rows = (
+            [self.empty_mask] * len(cleared) + [self.rows[y] for y in kept]
+            + self.rows[row_count:]
+        )
+        for x, column in enumerate(self.columns):
+            for y in cleared:
+                # Keep the bits below row y, move the bits above it down
+                below = column & ~((2 << y) - 1)
+                column = below | ((column & ((1 << y) - 1)) << 1)
+            self.columns[x] = column
+        return cleared
+
+    def lock(self, structure, x, y):
+        self.place(structure, x, y)
+        return self.clear_lines()
+
+
+# Actions for TetrisGame.step
+ROTATE, LEFT, RIGHT, DROP = range(4)
+
+
+class TetrisGame:
+    # The whole game state, usable without a window: step() applies a player
+    # action and tick() advances the gravity timer. Pieces come from a 7-bag,
+    # every bag is a shuffle of all seven pieces from the game's own rng.
+    __slots__ = (
+        "grid", "rng", "sequence", "piece_x", "piece_y", "piece_type",
+        "piece_rotation", "timer", "lines", "pieces", "game_over",
+    )
+
+    def __init__(self, seed=None, col_count=grid_x_count,
+                 row_count=grid_y_count):
+        self.grid = TetrisBoard(col_count, row_count)
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.grid.reset()
+        self.timer = 0
+        self.lines = 0
+        self.pieces = 0
+        self.game_over = False
+        self.new_sequence()
+        self.new_piece()
+
+    def new_sequence(self):
+        self.sequence = list(range(len(piece_structures)))
+        self.rng.shuffle(self.sequence)
+
+    def new_piece(self):
+        self.piece_x = 3
+        self.piece_y = 0
+        self.piece_type = self.sequence.pop()
+        if len(self.sequence) == 0:
+            self.new_sequence()
+        self.piece_rotation = 0
+
+    def can_piece_move(self, test_x, test_y, test_rotation):
+        piece = piece_masks[self.piece_type][test_rotation]
+        return not self.grid.collides(piece, test_x, test_y)
+
+    def step(self, action):
+        # Returns True when the piece moved
+        if self.game_over:
+            self.reset()
+            return False
+        test_x, test_y = self.piece_x, self.piece_y
+        test_rotation = self.piece_rotation
+
+        if action == ROTATE:
+            test_rotation += 1
+            if test_rotation > len(piece_structures[self.piece_type]) - 1:
+                test_rotation = 0
+        elif action == LEFT:
+            test_x -= 1
+        elif action == RIGHT:
+            test_x += 1
+        elif action == DROP:
+            piece = piece_masks[self.piece_type][test_rotation]
+            landing_y = self.grid.drop_y(piece, test_x, test_y)
+            if landing_y == test_y:
+                return False
+            # The piece locks on the next tick
+            self.piece_y = landing_y
+            self.timer = timer_limit
+            return True
+
+        if not self.can_piece_move(test_x, test_y, test_rotation):
+            return False
+        self.piece_x = test_x
+        self.piece_rotation = test_rotation
+        return True
+
+    def tick(self, dt):
+        # Returns the rows cleared by a piece locking during this tick
+        if self.game_over:
+            self.reset()
+            return []
+        self.timer += dt
+        if self.timer < timer_limit:
+            return []
+        self.timer = 0
+        return self.fall()
+
+    def fall(self):
+        if self.can_piece_move(self.piece_x, self.piece_y + 1,
+                               self.piece_rotation):
+            self.piece_y += 1
+            return []
+        return self.lock()
+
+    def lock(self):
+        # Add piece to the board and remove complete rows
+        structure = piece_structures[self.piece_type][self.piece_rotation]
+        cleared = self.grid.lock(structure, self.piece_x, self.piece_y)
+        self.lines += len(cleared)
+        self.pieces += 1
+
+        self.new_piece()
+        if not self.can_piece_move(self.piece_x, self.piece_y,
+                                   self.piece_rotation):
+            # The next step or tick starts a new game
+            self.game_over = True
+        return cleared
+
+
+class BlocksRenderer:
+    # One cached tile per block type, and an image of the locked blocks that
+    # is only drawn again when the board changes. A frame is one blit for
+    # the board plus a few tiles for the falling piece and the preview.
+
+    def __init__(self, offset_x=2, offset_y=5, preview_x=5, preview_y=1):
+        self.offset = (offset_x * block_size, offset_y * block_size)
+        self.preview = (preview_x * block_size, preview_y * block_size)
+        self.tiles = {}
+        self.board = None
+        self.board_key = None
+
+    def get_tile(self, block):
+        tile = self.tiles.get(block)
+        if tile is None:
+            tile = pygame.Surface((block_size - 1, block_size - 1))
+            tile.fill(block_colors[block])
+            self.tiles[block] = tile
+        return tile
+
+    def render_board(self, grid):
+        key = (grid, grid.version)
+        if key != self.board_key:
+            size = (grid.col_count * block_size, grid.row_count * block_size)
+            if self.board is None or self.board.get_size() != size:
+                self.board = pygame.Surface(size)
+            self.board.fill(background_color)
+            for y, row in enumerate(grid.cells):
+                for x, block in enumerate(row):
+                    self.board.blit(
+                        self.get_tile(block), (x * block_size, y * block_size)
+                    )
+            self.board_key = key
+        return self.board
+
+    def draw_piece(self, screen, tile, piece, x, y, origin):
+        for dx, dy in piece[2]:
+            screen.blit(tile, (
+                origin[0] + (x + dx) * block_size,
+                origin[1] + (y + dy) * block_size,
+            ))
+
+    def draw(self, screen, game):
+        screen.blit(self.render_board(game.grid), self.offset)
+        structure = piece_structures[game.piece_type][game.piece_rotation]
+        piece = piece_masks[game.piece_type][game.piece_rotation]
+        block = structure[piece[2][0][1]][piece[2][0][0]]
+        self.draw_piece(screen, self.get_tile(block), piece,
+                        game.piece_x, game.piece_y, self.offset)
+        preview = piece_masks[game.sequence[-1]][0]
+        self.draw_piece(screen, self.get_tile("preview"), preview,
+                        0, 0, self.preview)
+
+
+game = TetrisGame()
+renderer = BlocksRenderer()
+key_actions = {
+    K_UP: ROTATE, K_SPACE: ROTATE, K_DOWN: DROP, K_LEFT: LEFT, K_RIGHT: RIGHT,
+}
 
 
 def update(dt):
-    global timer
-    global piece_y
-
-    timer += dt
-    if timer >= timer_limit:
-        timer = 0
-
-        test_y = piece_y + 1
-        if can_piece_move(piece_x, test_y, piece_rotation):
-            piece_y = test_y
-        else:
-            # Add piece to inert
-            for y in range(piece_y_count):
-                for x in range(piece_x_count):
-                    block = piece_structures[piece_type][piece_rotation][y][x]
-                    if block != " ":
-                        inert[piece_y + y][piece_x + x] = block
-
-            # Find complete rows
-            for y in range(grid_y_count):
-                complete = True
-                for x in range(grid_x_count):
-                    if inert[y][x] == " ":
-                        complete = False
-                        break
-
-                if complete:
-                    for ry in range(y, 1, -1):
-                        for rx in range(grid_x_count):
-                            inert[ry][rx] = inert[ry - 1][rx]
-
-                    for rx in range(grid_x_count):
-                        inert[0][rx] = " "
-
-            new_piece()
-
-            if not can_piece_move(piece_x, piece_y, piece_rotation):
-                reset()
+    game.tick(dt)
 
 
 def on_key_down(key):
-    global piece_rotation
-    global piece_x
-    global piece_y
-    global timer
-
-    if key == keys.UP or key == keys.SPACE:
-        test_rotation = piece_rotation + 1
-        if test_rotation > len(piece_structures[piece_type]) - 1:
-            test_rotation = 0
-
-        if can_piece_move(piece_x, piece_y, test_rotation):
-            piece_rotation = test_rotation
-
-    elif key == keys.DOWN:
-        while can_piece_move(piece_x, piece_y + 1, piece_rotation):
-            piece_y += 1
-            timer = timer_limit
-
-    elif key == keys.LEFT:
-        test_x = piece_x - 1
-
-        if can_piece_move(test_x, piece_y, piece_rotation):
-            piece_x = test_x
-
-    elif key == keys.RIGHT:
-        test_x = piece_x + 1
-
-        if can_piece_move(test_x, piece_y, piece_rotation):
-            piece_x = test_x
+    action = key_actions.get(key)
+    if action is not None:
+        game.step(action)
 
 
 def draw():
-    screen.fill((255, 255, 255))
-
-    def draw_block(block, x, y):
-        colors = {
-            " ": (222, 222, 222),
-            "i": (120, 195, 239),
-            "j": (236, 231, 108),
-            "l": (124, 218, 193),
-            "o": (234, 177, 121),
-            "s": (211, 136, 236),
-            "t": (248, 147, 196),
-            "z": (169, 221, 118),
-            "preview": (190, 190, 190),
-        }
-        color = colors[block]
-
-        block_size = 20
-        block_draw_size = block_size - 1
-        screen.draw.filled_rect(
-            Rect(
-                x * block_size, y * block_size,
-                block_draw_size, block_draw_size
-            ),
-            color=color
-        )
-
-    offset_x = 2
-    offset_y = 5
-
-    for y in range(grid_y_count):
-        for x in range(grid_x_count):
-            draw_block(inert[y][x], x + offset_x, y + offset_y)
-
-    for y in range(piece_y_count):
-        for x in range(piece_x_count):
-            block = piece_structures[piece_type][piece_rotation][y][x]
-            if block != " ":
-                draw_block(
-                    block,
-                    x + piece_x + offset_x,
-                    y + piece_y + offset_y
-                )
-
-    for y in range(piece_y_count):
-        for x in range(piece_x_count):
-            block = piece_structures[sequence[-1]][0][y][x]
-            if block != " ":
-                draw_block("preview", x + 5, y + 1)
+    screen.fill(background_color)
+    renderer.draw(screen, game)
 
 
 TITLE = "俄罗斯方块"
 WIDTH = 20 * 14
 HEIGHT = 20 * 25
 
-pgzrun.go()
+board.run_game(__name__)
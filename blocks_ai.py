@@ -0,0 +1,193 @@
+""" 俄罗斯方块AI，枚举每种落点并按启发式评分，用于大批量调整权重
+
+    python blocks_ai.py --games 100 --workers 4
+    python blocks_ai.py --weights -0.51,0.76,-0.36,-0.18 --no-lookahead
+"""
+import argparse
+import operator
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import blocks
+
+# 总高度、消除行数、空洞数、相邻列高度差之和的权重
+DEFAULT_WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+MAX_PIECES = 1000  # 每局最多放的方块数，好的权重可能永远不会输
+LOST_SCORE = float("-inf")
+
+
+def spawn_placements(board, piece_type) -> [(int, int, int)]:
+    """ 从出生位置能到达的所有(旋转, 列, 落点行)
+
+    先在出生位置依次旋转，再左右平移，最后直接下落到落点。
+    """
+    rotations = blocks.piece_masks[piece_type]
+    placements = []
+    spawn_x, spawn_y = 3, 0
+    for rotation, piece in enumerate(rotations):
+        if board.collides(piece, spawn_x, spawn_y):
+            break  # 转不到这个方向，后面的方向也转不到
+        placements.append(
+            (rotation, spawn_x, board.drop_y(piece, spawn_x, spawn_y))
+        )
+        for step in (-1, 1):
+            x = spawn_x + step
+            while not board.collides(piece, x, spawn_y):
+                placements.append(
+                    (rotation, x, board.drop_y(piece, x, spawn_y))
+                )
+                x += step
+    return placements
+
+
+def evaluate(board, lines, weights) -> float:
+    """ 按列掩码计算总高度、空洞和高度差，与消除行数加权求和 """
+    columns = board.columns
+    # 最低位是最上面的方块，只剩地板时高度为0
+    top = board.row_count + 1
+    heights = [top - (column & -column).bit_length() for column in columns]
+    aggregate = sum(heights)
+    # 高度以内没有方块的格子都是空洞，每列的地板不算方块
+    filled = sum(column.bit_count() for column in columns) - len(columns)
+    holes = aggregate - filled
+    bumpiness = sum(map(abs, map(operator.sub, heights, heights[1:])))
+    w_height, w_lines, w_holes, w_bumpiness = weights
+    return (
+        w_height * aggregate + w_lines * lines
+        + w_holes * holes + w_bumpiness * bumpiness
+    )
+
+
+def after_placement(board, piece_type, rotation, x, y):
+    """ 放下方块并消除整行后的棋盘(只有掩码)和消除的行数 """
+    result = board.copy(with_cells=False)
+    result.place_piece(blocks.piece_masks[piece_type][rotation], x, y)
+    return result, len(result.clear_lines())
+
+
+class TetrisAI:
+    """ 对当前方块的每个落点评分，lookahead时还考虑预览的下一个方块 """
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, lookahead=True):
+        self.weights = tuple(weights)
+        self.lookahead = lookahead
+
+    def best_score(self, board, piece_type, lines=0) -> float:
+        """ 方块所有落点中最好的评分，没有落点时为LOST_SCORE """
+        best = LOST_SCORE
+        for rotation, x, y in spawn_placements(board, piece_type):
+            result, cleared = after_placement(board, piece_type, rotation, x, y)
+            best = max(best, evaluate(result, lines + cleared, self.weights))
+        return best
+
+    def choose(self, game) -> (int, int):
+        """ 返回当前方块最好的(旋转, 列)，没有落点时返回None """
+        board = game.grid
+        best, choice = LOST_SCORE, None
+        for rotation, x, y in spawn_placements(board, game.piece_type):
+            result, cleared = after_placement(
+                board, game.piece_type, rotation, x, y
+            )
+            if self.lookahead:
+                score = self.best_score(result, game.sequence[-1], cleared)
+            else:
+                score = evaluate(result, cleared, self.weights)
+            if choice is None or score > best:
+                best, choice = score, (rotation, x)
+        return choice
+
+    def move(self, game) -> bool:
+        """ 用TetrisGame.step把方块转到选好的方向和列，落下并固定 """
+        choice = self.choose(game)
+        if choice is None:
+            return False
+        rotation, x = choice
+        for _ in range(rotation):
+            game.step(blocks.ROTATE)
+        action = blocks.LEFT if x < game.piece_x else blocks.RIGHT
+        while game.piece_x != x:
+            if not game.step(action):
+                return False
+        game.step(blocks.DROP)
+        game.fall()  # 已经在落点上，这一步直接固定
+        return True
+
+    def play(self, game, max_pieces=MAX_PIECES) -> (int, int):
+        """ 下完一局(或放满max_pieces个方块)，返回(消除行数, 方块数) """
+        while not game.game_over and game.pieces < max_pieces:
+            if not self.move(game):
+                break
+        return game.lines, game.pieces
+
+
+def play_game(seed, weights=DEFAULT_WEIGHTS, lookahead=True,
+              max_pieces=MAX_PIECES) -> (int, int, float):
+    """ 用指定种子下一局，返回(消除行数, 方块数, 耗时)，可以在工作进程中运行 """
+    started = time.perf_counter()
+    game = blocks.TetrisGame(seed)
+    lines, pieces = TetrisAI(weights, lookahead).play(game, max_pieces)
+    return lines, pieces, time.perf_counter() - started
+
+
+def run_batch(games, seed=None, weights=DEFAULT_WEIGHTS, lookahead=True,
+              max_pieces=MAX_PIECES, workers=None) -> dict:
+    """ 下games局，workers不为1时分给进程池，返回平均消除行数和每秒方块数 """
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(games)]
+    args = (
+        seeds, [weights] * games, [lookahead] * games, [max_pieces] * games
+    )
+    started = time.perf_counter()
+    if workers == 1:
+        results = list(map(play_game, *args))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(play_game, *args))
+    elapsed = time.perf_counter() - started
+    lines = sum(result[0] for result in results)
+    pieces = sum(result[1] for result in results)
+    return {
+        "games": games,
+        "average_lines": lines / games if games else 0,
+        "average_pieces": pieces / games if games else 0,
+        "pieces_per_second": pieces / elapsed if elapsed else None,
+        "seconds": elapsed,
+    }
+
+
+def parse_weights(text) -> tuple:
+    weights = tuple(float(value) for value in text.split(","))
+    if len(weights) != len(DEFAULT_WEIGHTS):
+        raise argparse.ArgumentTypeError(
+            f"Expected {len(DEFAULT_WEIGHTS)} weights, got {text!r}"
+        )
+    return weights
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="俄罗斯方块AI批量对局")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="进程数，默认为CPU核数")
+    parser.add_argument("--max-pieces", type=int, default=MAX_PIECES)
+    parser.add_argument("--weights", type=parse_weights,
+                        default=DEFAULT_WEIGHTS,
+                        help="总高度,消除行数,空洞,高度差的权重")
+    parser.add_argument("--no-lookahead", dest="lookahead",
+                        action="store_false", help="不考虑预览的下一个方块")
+    args = parser.parse_args(argv)
+    result = run_batch(args.games, args.seed, args.weights, args.lookahead,
+                       args.max_pieces, args.workers)
+    print(f"games:         {result['games']}")
+    print(f"avg lines:     {result['average_lines']:.1f}")
+    print(f"avg pieces:    {result['average_pieces']:.1f}")
+    if result["pieces_per_second"] is not None:
+        print(f"pieces/s:      {result['pieces_per_second']:.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
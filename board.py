@@ -3,6 +3,56 @@ import math
 import pygame.mouse
 
 
+class NeighborTable:
+    """ 每个单元格周围（最多）8个单元格的序号
+
+    单元格(x, y)的序号为 y * col_count + x。不在边上的单元格，
+    邻居就是自身序号加上8个固定偏移，不需要保存；只有边上的单元格要判断越界，
+    第一次用到时算出来缓存，占用的内存只与边长有关。
+    """
+
+    def __init__(self, col_count, row_count):
+        self.col_count = col_count
+        self.row_count = row_count
+        self.deltas = tuple(
+            dy * col_count + dx
+            for dx in range(-1, 2) for dy in range(-1, 2)
+            if dx or dy
+        )
+        self.edges = {}  # 边上单元格的序号 -> 邻居序号
+
+    def find_neighbors(self, x, y) -> [int]:
+        """ 逐个判断越界，找出周围单元格的序号 """
+        return [
+            (y + dy) * self.col_count + x + dx
+            for dx in range(-1, 2) for dy in range(-1, 2)
+            if (
+                    not (dx == 0 and dy == 0)
+                    and 0 <= (x + dx) < self.col_count
+                    and 0 <= (y + dy) < self.row_count
+            )
+        ]
+
+    def neighbors(self, index) -> [int]:
+        """ 序号为index的单元格周围（最多）8个单元格的序号 """
+        cols = self.col_count
+        x = index % cols
+        if 0 < x < cols - 1 and cols <= index < (self.row_count - 1) * cols:
+            return [index + d for d in self.deltas]
+        cells = self.edges.get(index)
+        if cells is None:
+            cells = tuple(self.find_neighbors(x, index // cols))
+            self.edges[index] = cells
+        return cells
+
+    def neighbor_cells(self, x, y) -> [(int, int)]:
+        """ 单元格(x, y)周围（最多）8个单元格的位置 """
+        cols = self.col_count
+        return [
+            (i % cols, i // cols) for i in self.neighbors(y * cols + x)
+        ]
+
+
 class Board:
     """ 棋盘 """
 
@@ -11,6 +61,14 @@ class Board:
         self.col_count = col_count
         self.row_count = row_count
         self.info_height = info_height
+        self.neighbor_table = NeighborTable(col_count, row_count)
+        self.reset()
+
+    def resize(self, col_count, row_count):
+        """ 改变棋盘大小，换成新的邻居表并重开游戏 """
+        self.col_count = col_count
+        self.row_count = row_count
+        self.neighbor_table = NeighborTable(col_count, row_count)
         self.reset()
 
     def reset(self):
@@ -43,18 +101,38 @@ class Board:
         return self.get_mouse_loc(mouse_x, mouse_y)
 
     def get_mouse_loc(self, mouse_x, mouse_y) -> (int, int):
-        """ 鼠标选中的单元格位置 """
-        sx = min(math.floor(mouse_x / self.cell_size), self.col_count - 1)
-        sy = min(math.floor(mouse_y / self.cell_size), self.row_count - 1)
+        """ 鼠标选中的单元格位置，拖到窗口外松开时坐标可能超出范围甚至为负 """
+        sx = math.floor(mouse_x / self.cell_size)
+        sy = math.floor(mouse_y / self.cell_size)
+        sx = min(max(sx, 0), self.col_count - 1)
+        sy = min(max(sy, 0), self.row_count - 1)
         return sx, sy
 
+    def get_index(self, x, y) -> int:
+        """ 单元格的序号 """
+        return y * self.col_count + x
+
+    def get_position(self, index) -> (int, int):
+        """ 序号对应的单元格位置 """
+        y, x = divmod(index, self.col_count)
+        return x, y
+
+    def get_neighbor_indexes(self, index) -> [int]:
+        """ 找出周围（最多）8个单元格的序号 """
+        return self.neighbor_table.neighbors(index)
+
     def get_neighbor_cells(self, x, y) -> [(int, int)]:
         """ 找出周围（最多）8个单元格 """
-        for dx in range(-1, 2):
-            for dy in range(-1, 2):
-                if (
-                        not (dx == 0 and dy == 0)
-                        and 0 <= (x + dx) < self.col_count
-                        and 0 <= (y + dy) < self.row_count
-                ):
-                    yield x + dx, y + dy
+        return self.neighbor_table.neighbor_cells(x, y)
+
+
+def run_game(name):
+    """ 作为游戏运行时打开窗口，在游戏模块的最后调用 run_game(__name__)
+
+    import pgzrun会改写__main__模块（包括__name__）并打开窗口，
+    推迟到这里才导入，模块中前面的 __name__ == "__main__" 判断不受影响，
+    被求解器等工具import时也不会打开窗口。
+    """
+    if name == "__main__":
+        import pgzrun
+        pgzrun.go()
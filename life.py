@@ -1,57 +1,192 @@
-import pgzrun
+import sys
+
+import life_headless
+
+if __name__ == "__main__" and life_headless.HEADLESS_FLAG in sys.argv[1:]:
+    # 无界面运行，不需要加载pygame
+    sys.exit(life_headless.main())
+
+import pygame
 from pgzero.constants import mouse
 from pygame import Rect
-from pygame.constants import K_SPACE, K_LEFT, K_RIGHT
+from pygame.constants import K_SPACE, K_LEFT, K_RIGHT, K_UP
+from pygame.constants import K_w, K_a, K_s, K_d
 
 import board
+import life_engine
+import life_pattern
+
+try:
+    import numpy as np
+    import pygame.surfarray
+except ImportError:  # numpy 是可选依赖，缺失时只能逐个单元格绘制
+    np = None
 
 CELL_SIZE = 10
 X_COUNT, Y_COUNT = 70, 50
+# 支持快速跳代的引擎，按UP键一次演化的代数
+JUMP_GENERATIONS = 2 ** 20
+# 无边界的引擎，按WASD键移动视口，每次移动的单元格数
+PAN_STEP = 10
+PAN_KEYS = {K_w: (0, -1), K_a: (-1, 0), K_s: (0, 1), K_d: (1, 0)}
 
 BACK_COLOR = (212, 212, 212)
 DEAD_COLOR = (220, 220, 220)
 LIVE_COLOR = (255, 0, 255)
+# 单元格不大于此尺寸时视为缩小显示，整个棋盘一次性写入像素
+ARRAY_CELL_SIZE = 4
+# 变化的单元格超过此比例时，也改为整个棋盘一次性写入
+ARRAY_CHANGE_RATIO = 0.25
+
+
+class LifeRenderer:
+    """ 保存一张画好的棋盘图像，每帧只重画与上一帧不同的单元格 """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.surface = None
+        self.last_grid = None
+
+    def invalidate(self):
+        """ 丢弃已画好的图像，下一帧全部重画 """
+        self.surface = None
+        self.last_grid = None
+
+    def cell_rect(self, x, y) -> Rect:
+        cell_draw_size = max(self.cell_size - 1, 1)
+        return Rect(
+            (x * self.cell_size, y * self.cell_size),
+            (cell_draw_size, cell_draw_size)
+        )
+
+    def render(self, grid) -> pygame.Surface:
+        """ 画出grid并返回图像，grid尺寸变化时全部重画 """
+        row_count, col_count = len(grid), len(grid[0]) if grid else 0
+        size = (col_count * self.cell_size, row_count * self.cell_size)
+        if self.surface is None or self.surface.get_size() != size:
+            self.surface = pygame.Surface(size)
+            self.draw_all(grid)
+        else:
+            changes = self.find_changes(grid)
+            use_array = np is not None and (
+                self.cell_size <= ARRAY_CELL_SIZE
+                or len(changes) > row_count * col_count * ARRAY_CHANGE_RATIO
+            )
+            if use_array:
+                self.draw_array(grid)
+            else:
+                for x, y, alive in changes:
+                    color = LIVE_COLOR if alive else DEAD_COLOR
+                    self.surface.fill(color, self.cell_rect(x, y))
+        self.last_grid = grid
+        return self.surface
+
+    def find_changes(self, grid) -> [(int, int, bool)]:
+        """ 与上一帧比较，找出变化的单元格，先整行比较跳过相同的行 """
+        changes = []
+        for y, (old_row, row) in enumerate(zip(self.last_grid, grid)):
+            if old_row == row:
+                continue
+            for x, (old, alive) in enumerate(zip(old_row, row)):
+                if old != alive:
+                    changes.append((x, y, alive))
+        return changes
+
+    def draw_all(self, grid):
+        """ 全部重画 """
+        if np is not None:
+            return self.draw_array(grid)
+        self.surface.fill(BACK_COLOR)
+        for y, row in enumerate(grid):
+            for x, alive in enumerate(row):
+                color = LIVE_COLOR if alive else DEAD_COLOR
+                self.surface.fill(color, self.cell_rect(x, y))
+
+    def draw_array(self, grid):
+        """ 先拼出整个棋盘的像素数组，再一次写入图像 """
+        alive = np.asarray(grid, dtype=bool)
+        row_count, col_count = alive.shape
+        size = self.cell_size
+        colors = np.where(
+            alive[..., None],
+            np.array(LIVE_COLOR, dtype=np.uint8),
+            np.array(DEAD_COLOR, dtype=np.uint8),
+        )
+        pixels = np.empty((row_count, size, col_count, size, 3), np.uint8)
+        pixels[:] = BACK_COLOR
+        # 每个单元格右侧和下方留出1像素的间隔
+        cell_draw_size = max(size - 1, 1)
+        pixels[:, :cell_draw_size, :, :cell_draw_size] = colors[:, None, :, None]
+        pixels = pixels.reshape(row_count * size, col_count * size, 3)
+        pygame.surfarray.blit_array(self.surface, pixels.swapaxes(0, 1))
 
 
 class LifeBoard(board.Board):
     """ 细胞游戏 """
     name = "细胞"
-    grid = []
+    engine = None
+    view_x, view_y = 0, 0  # 视口左上角在平面上的坐标
 
-    def __init__(self):
+    def __init__(self, engine_name=life_engine.DEFAULT_ENGINE, **options):
+        self.engine_name = engine_name
+        self.engine_options = options
+        self.renderer = LifeRenderer(CELL_SIZE)
         super().__init__(CELL_SIZE, X_COUNT, Y_COUNT)
 
     def reset(self):
         """ 重开游戏，所有单元格设置为无生命 """
-        self.grid = [
-            [False] * self.col_count
-            for _ in range(self.row_count)
-        ]
+        if self.engine is not None:
+            self.engine.close()
+        self.engine = life_engine.create_engine(
+            self.engine_name, self.col_count, self.row_count,
+            **self.engine_options
+        )
+        self.view_x, self.view_y = 0, 0
+        self.renderer.invalidate()
+
+    @property
+    def grid(self) -> [[bool]]:
+        """ 视口内所有单元格的生死，二维列表 """
+        return self.engine.to_grid(
+            self.view_x, self.view_y, self.col_count, self.row_count
+        )
+
+    @grid.setter
+    def grid(self, grid):
+        self.engine.load_grid(grid, self.view_x, self.view_y)
+
+    def load_pattern(self, path, x=0, y=0):
+        """ 读取RLE或.cells图案，放到视口中(x, y)开始的位置 """
+        return life_pattern.load_pattern(
+            path, self.engine, self.view_x + x, self.view_y + y
+        )
+
+    def save_pattern(self, path):
+        """ 将视口内的细胞保存为RLE或.cells图案 """
+        life_pattern.save_pattern(
+            path, self.engine, self.view_x, self.view_y,
+            self.col_count, self.row_count
+        )
 
     def change_grid(self):
-        next_grid = []
-        for y in range(self.row_count):
-            next_grid.append([])
-            for x in range(self.col_count):
-                neighbor_count = sum(
-                    1 for nx, ny in self.get_neighbor_cells(x, y)
-                    if self.grid[ny][nx]
-                )
-                next_grid[y].append(
-                    neighbor_count == 3 or
-                    (self.grid[y][x] and neighbor_count == 2)
-                )
-        return next_grid
+        """ 演化一代 """
+        self.engine.step()
 
     def on_clicked(self, button, mouse_x=0, mouse_y=0):
         sx, sy = self.get_mouse_loc(mouse_x, mouse_y)
         # print("mouse:", button, sx, sy)
+        sx, sy = sx + self.view_x, sy + self.view_y
         if button == mouse.LEFT:
-            self.grid[sy][sx] = True
+            self.engine.set_cell(sx, sy, True)
         elif button == mouse.RIGHT:
-            self.grid[sy][sx] = False
+            self.engine.set_cell(sx, sy, False)
 
     def on_pressed(self, key):
+        if key in PAN_KEYS and self.engine.unbounded:
+            dx, dy = PAN_KEYS[key]
+            self.view_x += dx * PAN_STEP
+            self.view_y += dy * PAN_STEP
+            return
         num = 1
         if key == K_RIGHT:
             num = 2
@@ -59,30 +194,22 @@ class LifeBoard(board.Board):
             num = 5
         if key == K_SPACE:
             num = 23
-        for _ in range(num):
-            self.grid = self.change_grid()
+        if key == K_UP and self.engine.fast_forward:
+            num = JUMP_GENERATIONS
+        self.engine.step(num)
 
     def draw_screen(self, screen):
-        screen.fill(BACK_COLOR)
-
-        for y in range(self.row_count):
-            for x in range(self.col_count):
-
-                cell_draw_size = self.cell_size - 1
-                rect = Rect(
-                    (x * self.cell_size, y * self.cell_size),
-                    (cell_draw_size, cell_draw_size)
-                )
-
-                if self.grid[y][x]:
-                    color = LIVE_COLOR
-                else:
-                    color = DEAD_COLOR
-
-                screen.draw.filled_rect(rect, color)
+        screen.blit(self.renderer.render(self.grid), (0, 0))
 
 
-game = LifeBoard()
+if __name__ == "__main__":
+    # 窗口模式下也可以选择引擎和初始图案
+    ARGS = life_headless.parse_args()
+    game = LifeBoard(ARGS.engine, **dict(ARGS.option))
+    if ARGS.pattern:
+        game.load_pattern(ARGS.pattern, ARGS.x, ARGS.y)
+else:
+    game = LifeBoard()
 TITLE = game.name  # 窗口标题
 WIDTH, HEIGHT = game.screen_size
 
@@ -103,4 +230,4 @@ def draw():
     game.draw_screen(screen)
 
 
-pgzrun.go()
+board.run_game(__name__)
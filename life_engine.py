@@ -0,0 +1,1057 @@
+import itertools
+import multiprocessing
+import os
+import random
+import time
+import weakref
+from collections import Counter
+from multiprocessing import shared_memory
+
+from neighbors import count_neighbors
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，缺失时只能使用列表引擎
+    np = None
+
+
+class LifeEngine:
+    """ 细胞演化引擎，负责保存细胞状态并计算下一代 """
+    name = ""
+    fast_forward = False  # 能否快速跳过大量代数
+    unbounded = False  # 是否在无边界的平面上演化
+
+    def __init__(self, col_count, row_count):
+        self.col_count = col_count
+        self.row_count = row_count
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        """ 所有单元格设置为无生命 """
+        raise NotImplementedError
+
+    def get_cell(self, x, y) -> bool:
+        """ 单元格是否有生命 """
+        raise NotImplementedError
+
+    def set_cell(self, x, y, alive):
+        """ 设置单元格的生死 """
+        raise NotImplementedError
+
+    def step(self, num=1):
+        """ 演化num代 """
+        raise NotImplementedError
+
+    def close(self):
+        """ 释放引擎占用的进程等资源 """
+
+    def get_row(self, y, x=0, count=None) -> [bool]:
+        """ 取出第y行从x开始的count个单元格 """
+        if count is None:
+            count = self.col_count - x
+        return [self.get_cell(x + dx, y) for dx in range(count)]
+
+    def to_grid(self, x=0, y=0, col_count=None, row_count=None) -> [[bool]]:
+        """ 将(x, y)开始的视口转为二维列表，即LifeBoard.grid的格式 """
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        return [self.get_row(y + dy, x, col_count) for dy in range(row_count)]
+
+    def live_cells(self, x=0, y=0, col_count=None, row_count=None):
+        """ 找出(x, y)开始的区域内的存活细胞，按先行后列的顺序
+        返回相对区域左上角的坐标 """
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        return [
+            (dx, dy) for dy in range(row_count)
+            for dx, alive in enumerate(self.get_row(y + dy, x, col_count))
+            if alive
+        ]
+
+    def load_grid(self, grid, x=0, y=0):
+        """ 将二维列表写入到(x, y)开始的区域 """
+        for dy, row in enumerate(grid):
+            for dx, alive in enumerate(row):
+                self.set_cell(x + dx, y + dy, bool(alive))
+
+    @property
+    def population(self) -> int:
+        """ 存活的细胞数量 """
+        return sum(sum(row) for row in self.to_grid())
+
+
+class ListEngine(LifeEngine):
+    """ 二维列表实现，逐个单元格统计邻居，作为其他引擎的参照 """
+    name = "list"
+    grid = []
+
+    def reset(self):
+        self.grid = [
+            [False] * self.col_count
+            for _ in range(self.row_count)
+        ]
+        self.generation = 0
+
+    def get_cell(self, x, y) -> bool:
+        return self.grid[y][x]
+
+    def set_cell(self, x, y, alive):
+        self.grid[y][x] = alive
+
+    def get_row(self, y, x=0, count=None) -> [bool]:
+        if count is None:
+            count = self.col_count - x
+        return self.grid[y][x:x + count]
+
+    def get_neighbor_cells(self, x, y) -> [(int, int)]:
+        """ 找出周围（最多）8个单元格 """
+        for dx in range(-1, 2):
+            for dy in range(-1, 2):
+                if (
+                        not (dx == 0 and dy == 0)
+                        and 0 <= (x + dx) < self.col_count
+                        and 0 <= (y + dy) < self.row_count
+                ):
+                    yield x + dx, y + dy
+
+    def change_grid(self) -> [[bool]]:
+        next_grid = []
+        for y in range(self.row_count):
+            next_grid.append([])
+            for x in range(self.col_count):
+                neighbor_count = sum(
+                    1 for nx, ny in self.get_neighbor_cells(x, y)
+                    if self.grid[ny][nx]
+                )
+                next_grid[y].append(
+                    neighbor_count == 3 or
+                    (self.grid[y][x] and neighbor_count == 2)
+                )
+        return next_grid
+
+    def step(self, num=1):
+        for _ in range(num):
+            self.grid = self.change_grid()
+        self.generation += num
+
+
+class NumpyEngine(LifeEngine):
+    """ uint8二维数组实现，用错位切片求和一次算出所有邻居数量 """
+    name = "numpy"
+
+    def __init__(self, col_count, row_count):
+        if np is None:
+            raise RuntimeError("NumpyEngine requires numpy to be installed")
+        super().__init__(col_count, row_count)
+
+    def reset(self):
+        # 四周多留一圈永远为0的边框，切片时不需要判断越界
+        self.padded = np.zeros(
+            (self.row_count + 2, self.col_count + 2), dtype=np.uint8
+        )
+        self.grid = self.padded[1:-1, 1:-1]
+        self.counts = np.zeros_like(self.grid)
+        self.generation = 0
+
+    def get_cell(self, x, y) -> bool:
+        return bool(self.grid[y, x])
+
+    def set_cell(self, x, y, alive):
+        self.grid[y, x] = 1 if alive else 0
+
+    def get_row(self, y, x=0, count=None) -> [bool]:
+        if count is None:
+            count = self.col_count - x
+        return self.grid[y, x:x + count].astype(bool).tolist()
+
+    def to_grid(self, x=0, y=0, col_count=None, row_count=None) -> [[bool]]:
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        view = self.grid[y:y + row_count, x:x + col_count]
+        return view.astype(bool).tolist()
+
+    def live_cells(self, x=0, y=0, col_count=None, row_count=None):
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        rows, cols = np.nonzero(self.grid[y:y + row_count, x:x + col_count])
+        return list(zip(cols.tolist(), rows.tolist()))
+
+    def load_grid(self, grid, x=0, y=0):
+        data = np.asarray(grid, dtype=bool)
+        rows, cols = data.shape
+        self.grid[y:y + rows, x:x + cols] = data
+
+    @property
+    def population(self) -> int:
+        return int(np.count_nonzero(self.grid))
+
+    def count_neighbors(self):
+        """ 将8个方向错位的切片相加，得到每个单元格的邻居数量 """
+        return count_neighbors(self.padded, self.counts)
+
+    def step(self, num=1):
+        for _ in range(num):
+            next_generation(self.padded, self.grid, self.counts)
+        self.generation += num
+
+
+class TiledEngine(NumpyEngine):
+    """ 按块增量演化，只重新计算上一代有变化的块及其相邻块
+
+    棋盘切成tile_size见方的块，上一代内容有变化的块记为活跃，
+    变化位于块的边或角上时，挨着这条边或这个角的相邻块也记为活跃，
+    其他块的下一代与当前代相同，直接保留。
+    所有活跃块连同一圈边界横向排成一个二维数组，一次算出它们的下一代，
+    每行是连续的长数组，比逐块的小数组运算开销小得多；
+    活跃块占比超过full_ratio时改为整体计算，再逐块比较找出变化。
+    """
+    name = "tiled"
+    full_ratio = 0.5
+
+    def __init__(self, col_count, row_count, tile_size=16):
+        self.tile_size = tile_size
+        super().__init__(col_count, row_count)
+
+    def reset(self):
+        size = self.tile_size
+        tile_rows = -(-self.row_count // size)
+        tile_cols = -(-self.col_count // size)
+        height, width = tile_rows * size, tile_cols * size
+        # 补齐到块大小的整数倍，棋盘外的部分永远为0
+        self.buffer = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        self.padded = self.buffer[:self.row_count + 2, :self.col_count + 2]
+        self.grid = self.padded[1:-1, 1:-1]
+        self.counts = np.zeros_like(self.grid)
+        # 两个视图，按块编号直接取出带边界的块和块的内部
+        self.windows = np.lib.stride_tricks.sliding_window_view(
+            self.buffer, (size + 2, size + 2)
+        )[::size, ::size]
+        self.tiles = self.buffer[1:-1, 1:-1].reshape(
+            tile_rows, size, tile_cols, size
+        ).swapaxes(1, 2)
+        valid = np.zeros((height, width), dtype=np.uint8)
+        valid[:self.row_count, :self.col_count] = 1
+        self.valid = valid.reshape(
+            tile_rows, size, tile_cols, size
+        ).swapaxes(1, 2)
+        # 超出棋盘边界的块，演化后要清掉棋盘外的部分
+        self.partial = ~self.valid.all(axis=(2, 3))
+        self.has_partial = bool(self.partial.any())
+        self.diff = np.zeros((height, width), dtype=bool)
+        self.active = np.zeros((tile_rows, tile_cols), dtype=bool)
+        self.around = np.zeros((tile_rows + 2, tile_cols + 2), dtype=bool)
+        # 本块和相邻8块在around中相对的序号，顺序与step_tiles中的标记一致
+        self.around_offsets = np.array([
+            dy * (tile_cols + 2) + dx
+            for dy, dx in ((0, 0), (0, -1), (0, 1), (-1, 0), (1, 0),
+                           (-1, -1), (-1, 1), (1, -1), (1, 1))
+        ])[:, None]
+        self.tiles_computed = self.tiles_skipped = 0  # 最近一代
+        self.total_computed = self.total_skipped = 0
+        self.generation = 0
+
+    def mark_active(self, x, y):
+        """ 单元格有变化，所在的块和相邻块在下一代都要重新计算 """
+        ty, tx = y // self.tile_size, x // self.tile_size
+        self.active[max(ty - 1, 0):ty + 2, max(tx - 1, 0):tx + 2] = True
+
+    def set_cell(self, x, y, alive):
+        super().set_cell(x, y, alive)
+        self.mark_active(x, y)
+
+    def load_grid(self, grid, x=0, y=0):
+        super().load_grid(grid, x, y)
+        self.active[:] = True
+
+    def spread(self, changed):
+        """ 有变化的块连同相邻8块成为下一代的活跃块，先横向再纵向扩展
+
+        整体计算后不区分变化的位置，按最保守的方式扩展。
+        """
+        p = self.around
+        p[1:-1, 1:-1] = changed
+        rows = p[:, :-2] | p[:, 1:-1]
+        rows |= p[:, 2:]
+        active = rows[:-2] | rows[1:-1]
+        active |= rows[2:]
+        return active
+
+    def step_full(self):
+        """ 整体演化一代，返回有变化的块 """
+        old = self.grid.copy()
+        next_generation(self.padded, self.grid, self.counts)
+        np.not_equal(
+            old, self.grid, out=self.diff[:self.row_count, :self.col_count]
+        )
+        # 先合并每块内的各行，再合并每块内的各列
+        size = self.tile_size
+        tile_rows, tile_cols = self.active.shape
+        rows = np.logical_or.reduce(
+            self.diff.reshape(tile_rows, size, -1), axis=1
+        )
+        return rows.reshape(tile_rows, tile_cols, size).any(axis=2)
+
+    def step_tiles(self):
+        """ 只演化活跃块，返回下一代的活跃块 """
+        ty, tx = divmod(np.flatnonzero(self.active), self.active.shape[1])
+        count = len(ty)
+        size = self.tile_size
+        width = size + 2
+        # 复制出所有活跃块，横向排成形状为(s+2, k*(s+2))的数组
+        padded = self.windows[ty, tx].transpose(1, 0, 2).reshape(
+            width, count * width
+        )
+        # 块之间的接缝处算出的结果没有意义，每块只取自己的内部，
+        # 第j块内部的结果位于第 j*(s+2) 到 j*(s+2)+s-1 列
+        out = np.empty((size, count * width), dtype=np.uint8)
+        counts = np.empty_like(out)
+        next_generation(padded, out[:, :-2], counts[:, :-2])
+        tiles = out.reshape(size, count, width)[:, :, :size]
+        if self.has_partial and self.partial[ty, tx].any():
+            tiles &= self.valid[ty, tx].transpose(1, 0, 2)
+        self.tiles[ty, tx] = tiles.transpose(1, 0, 2)
+
+        diff = np.zeros((size, count * width), dtype=bool)
+        np.not_equal(out[:, :-2], padded[1:-1, 1:-1], out=diff[:, :-2])
+        diff = diff.reshape(size, count, width)[:, :, :size]
+        columns = np.logical_or.reduce(diff, axis=0)  # 形状为(k, s)
+        top, bottom = diff[0], diff[-1]
+        # 块内有变化时本块下一代要重新计算，变化在边上或角上时相邻块也要
+        flags = np.stack((
+            columns.any(axis=1), columns[:, 0], columns[:, -1],
+            top.any(axis=1), bottom.any(axis=1),
+            top[:, 0], top[:, -1], bottom[:, 0], bottom[:, -1],
+        ))
+        around = self.around
+        around[:] = False
+        centres = (ty + 1) * around.shape[1] + tx + 1
+        around.ravel()[(centres + self.around_offsets)[flags]] = True
+        return around[1:-1, 1:-1].copy()
+
+    def step(self, num=1):
+        total = self.active.size
+        for _ in range(num):
+            computed = int(np.count_nonzero(self.active))
+            if computed > total * self.full_ratio:
+                self.active = self.spread(self.step_full())
+                computed = total
+            elif computed:
+                self.active = self.step_tiles()
+            self.tiles_computed, self.tiles_skipped = computed, total - computed
+            self.total_computed += computed
+            self.total_skipped += total - computed
+        self.generation += num
+
+
+def next_generation(padded, out, counts):
+    """ 计算padded内部区域的下一代并写入out，out可以就是padded的内部 """
+    n = count_neighbors(padded, counts)
+    # 邻居数为3，或者自身存活且邻居数为2，两者合并即 (n | self) == 3
+    n |= padded[1:-1, 1:-1]
+    np.equal(n, 3, out=out, casting="unsafe")
+
+
+def step_band(names, shape, y0, y1, start, done, sync, command):
+    """ 并行引擎的工作进程，反复演化共享内存中[y0, y1)行的条带
+
+    从start取得命令后，每代读取当前缓冲区中条带及上下各一行的边界，
+    写入另一个缓冲区，然后在sync屏障处等待其他条带完成，再交换两个缓冲区，
+    全部完成后释放done。
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    buffers = [
+        np.ndarray(shape, dtype=np.uint8, buffer=block.buf) for block in blocks
+    ]
+    counts = np.zeros((y1 - y0, shape[1] - 2), dtype=np.uint8)
+    src = dst = None
+    try:
+        while True:
+            start.acquire()
+            num, current = int(command[0]), int(command[1])
+            if num < 0:
+                break
+            for _ in range(num):
+                src, dst = buffers[current], buffers[1 - current]
+                next_generation(
+                    src[y0:y1 + 2], dst[y0 + 1:y1 + 1, 1:-1], counts
+                )
+                sync.wait()
+                current = 1 - current
+            done.release()
+    finally:
+        # 释放所有指向共享内存的数组后才能关闭
+        src = dst = buffers = None
+        for block in blocks:
+            block.close()
+
+
+class ParallelEngine(NumpyEngine):
+    """ 多进程实现，棋盘按行切成条带，每个工作进程负责一条
+
+    两个带边框的缓冲区都放在共享内存中，轮流作为当前代和下一代，
+    每代之间只用屏障同步，不需要在进程间传递数据。
+    演化规则与NumpyEngine完全相同，结果逐位一致。
+    主进程等待时定期检查工作进程，有进程意外退出就关闭引擎并抛出RuntimeError。
+    """
+    name = "parallel"
+    processes = []
+    poll_interval = 0.1  # 等待工作进程时检查存活的间隔秒数
+    join_timeout = 5.0  # 关闭时等待工作进程退出的秒数
+
+    def __init__(self, col_count, row_count, workers=None):
+        self.workers = min(workers or os.cpu_count() or 1, row_count)
+        super().__init__(col_count, row_count)
+
+    def reset(self):
+        if not self.processes:
+            self.start()
+        for buffer in self.buffers:
+            buffer.fill(0)
+        self.generation = 0
+
+    def use_buffer(self, index):
+        """ 切换当前代所在的缓冲区 """
+        self.current = index
+        self.padded = self.buffers[index]
+        self.grid = self.padded[1:-1, 1:-1]
+
+    def start(self):
+        """ 分配共享内存并启动工作进程 """
+        shape = (self.row_count + 2, self.col_count + 2)
+        size = shape[0] * shape[1]
+        self.blocks = [
+            shared_memory.SharedMemory(create=True, size=size)
+            for _ in range(2)
+        ]
+        self.buffers = [
+            np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+            for block in self.blocks
+        ]
+        self.use_buffer(0)
+        # 主进程通过start下达命令，通过done等待完成，都不会一直阻塞
+        self.start_signal = multiprocessing.Semaphore(0)
+        self.done_signal = multiprocessing.Semaphore(0)
+        sync = multiprocessing.Barrier(self.workers)
+        self.command = multiprocessing.Array("q", 2, lock=False)
+        names = [block.name for block in self.blocks]
+        bounds = [
+            self.row_count * i // self.workers for i in range(self.workers + 1)
+        ]
+        self.processes = [
+            multiprocessing.Process(
+                target=step_band, daemon=True,
+                args=(names, shape, y0, y1, self.start_signal,
+                      self.done_signal, sync, self.command),
+            )
+            for y0, y1 in zip(bounds, bounds[1:])
+        ]
+        for process in self.processes:
+            process.start()
+        self.finalizer = weakref.finalize(
+            self, self.shutdown, self.processes, self.blocks,
+            self.start_signal, self.command, self.join_timeout
+        )
+
+    @staticmethod
+    def shutdown(processes, blocks, start_signal, command, timeout):
+        """ 通知工作进程退出，释放共享内存，不响应的进程直接结束 """
+        command[0] = -1
+        for _ in processes:
+            start_signal.release()
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def check_workers(self):
+        """ 有工作进程已经退出时关闭引擎，抛出RuntimeError
+
+        其他工作进程可能卡在sync屏障，或者屏障的锁还被退出的进程持有，
+        无法通知它们退出，只能全部结束。
+        """
+        for process in self.processes:
+            if not process.is_alive():
+                message = (
+                    f"Worker process {process.pid} exited"
+                    f" with code {process.exitcode}"
+                )
+                for other in self.processes:
+                    other.kill()
+                self.close()
+                raise RuntimeError(message)
+
+    def close(self):
+        if self.processes:
+            del self.padded, self.grid, self.buffers
+            self.finalizer()
+            self.processes = []
+
+    def step(self, num=1):
+        if num <= 0:
+            return
+        if not self.processes:
+            raise RuntimeError("Engine is closed")
+        self.check_workers()
+        self.command[0], self.command[1] = num, self.current
+        for _ in self.processes:
+            self.start_signal.release()  # 开始演化
+        for _ in self.processes:
+            # 等待全部完成，期间工作进程退出时其他进程会卡在sync屏障
+            while not self.done_signal.acquire(timeout=self.poll_interval):
+                self.check_workers()
+        self.use_buffer((self.current + num) % 2)
+        self.generation += num
+
+
+class QuadNode:
+    """ HashLife四叉树节点，内容相同的节点在引擎中只保存一份 """
+    __slots__ = ("level", "nw", "ne", "sw", "se", "population")
+
+    def __init__(self, level, nw=None, ne=None, sw=None, se=None, population=0):
+        self.level = level  # 边长为 2 ** level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.population = population
+
+
+DEAD_LEAF = QuadNode(0, population=0)
+LIVE_LEAF = QuadNode(0, population=1)
+
+
+class HashLifeEngine(LifeEngine):
+    """ HashLife实现，用带记忆的四叉树一次跳过 2 ** k 代
+
+    细胞位于无边界的平面上，根节点始终以(0, 0)为中心，
+    棋盘只是从(0, 0)开始的一个视口，移出视口的细胞仍会继续演化。
+    规范节点表和演化结果缓存的总数超过max_nodes时，
+    每次跳跃之前只保留根节点可达的节点，并清空演化结果缓存；
+    跳跃过程中超过时丢弃较早的一半演化结果，规范节点表仍然超过时也清空，
+    已经建好的节点不受影响，只是之后可能出现内容重复的节点。
+    """
+    name = "hashlife"
+    fast_forward = True
+    unbounded = True
+    max_nodes = 1 << 20
+
+    def __init__(self, col_count, row_count, max_nodes=None):
+        if max_nodes is not None:
+            self.max_nodes = max_nodes
+        self.gc_count = 0
+        super().__init__(col_count, row_count)
+
+    def reset(self):
+        self.nodes = {}  # (nw, ne, sw, se) -> 规范节点
+        self.results = {}  # (node, j) -> 中心区域演化 2 ** j 代后的节点
+        self.empties = [DEAD_LEAF]
+        self.root = self.empty(3)
+        self.generation = 0
+
+    @property
+    def cache_size(self) -> int:
+        """ 规范节点与演化结果缓存的总数 """
+        return len(self.nodes) + len(self.results)
+
+    def join(self, nw, ne, sw, se) -> QuadNode:
+        """ 由四个子节点组成上一层的规范节点 """
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+        if node is None:
+            population = (
+                nw.population + ne.population + sw.population + se.population
+            )
+            node = QuadNode(nw.level + 1, nw, ne, sw, se, population)
+            self.nodes[key] = node
+        return node
+
+    def empty(self, level) -> QuadNode:
+        """ 边长为 2 ** level 的空白节点 """
+        while len(self.empties) <= level:
+            e = self.empties[-1]
+            self.empties.append(self.join(e, e, e, e))
+        return self.empties[level]
+
+    def centre(self, node) -> QuadNode:
+        """ 在四周补上空白，得到中心位置不变、边长翻倍的节点 """
+        e = self.empty(node.level - 1)
+        return self.join(
+            self.join(e, e, e, node.nw), self.join(e, e, node.ne, e),
+            self.join(e, node.sw, e, e), self.join(node.se, e, e, e),
+        )
+
+    @staticmethod
+    def is_padded(node) -> bool:
+        """ 存活细胞是否都在中间一半的区域内 """
+        return node.level >= 3 and (
+            node.nw.population == node.nw.se.population
+            and node.ne.population == node.ne.sw.population
+            and node.sw.population == node.sw.ne.population
+            and node.se.population == node.se.nw.population
+        )
+
+    def life_4x4(self, node) -> QuadNode:
+        """ 4x4节点演化一代，返回中间的2x2节点 """
+        cells = [
+            [node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne],
+            [node.nw.sw, node.nw.se, node.ne.sw, node.ne.se],
+            [node.sw.nw, node.sw.ne, node.se.nw, node.se.ne],
+            [node.sw.sw, node.sw.se, node.se.sw, node.se.se],
+        ]
+        leaves = []
+        for y in (1, 2):
+            for x in (1, 2):
+                count = sum(
+                    cells[y + dy][x + dx].population
+                    for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                    if dx or dy
+                )
+                alive = count == 3 or (count == 2 and cells[y][x].population)
+                leaves.append(LIVE_LEAF if alive else DEAD_LEAF)
+        return self.join(*leaves)
+
+    def successor(self, node, j) -> QuadNode:
+        """ 中间一半的区域演化 2 ** j 代，j最大为 node.level - 2 """
+        j = min(j, node.level - 2)
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if node.population == 0:
+            result = self.empty(node.level - 1)
+        elif node.level == 2:
+            result = self.life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # 9个相互重叠的子区域，各自演化后再拼出中心区域
+            c = [
+                self.successor(sub, j) for sub in (
+                    nw,
+                    self.join(nw.ne, ne.nw, nw.se, ne.sw),
+                    ne,
+                    self.join(nw.sw, nw.se, sw.nw, sw.ne),
+                    self.join(nw.se, ne.sw, sw.ne, se.nw),
+                    self.join(ne.sw, ne.se, se.nw, se.ne),
+                    sw,
+                    self.join(sw.ne, se.nw, sw.se, se.sw),
+                    se,
+                )
+            ]
+            quads = [
+                (c[0], c[1], c[3], c[4]), (c[1], c[2], c[4], c[5]),
+                (c[3], c[4], c[6], c[7]), (c[4], c[5], c[7], c[8]),
+            ]
+            if j < node.level - 2:
+                # 已经演化了足够代数，只需取出各个中心
+                result = self.join(*(
+                    self.join(a.se, b.sw, c.ne, d.nw) for a, b, c, d in quads
+                ))
+            else:
+                result = self.join(*(
+                    self.successor(self.join(*quad), j) for quad in quads
+                ))
+        self.results[key] = result
+        if len(self.nodes) + len(self.results) > self.max_nodes:
+            self.trim()
+        return result
+
+    def trim(self):
+        """ 跳跃过程中缓存超出上限，这时找不到递归中用到的节点，只能丢弃缓存 """
+        results = self.results
+        self.results = dict(
+            itertools.islice(results.items(), len(results) // 2, None)
+        )
+        if len(self.nodes) > self.max_nodes:
+            self.nodes = {
+                (e.nw, e.ne, e.sw, e.se): e for e in self.empties[1:]
+            }
+        self.gc_count += 1
+
+    def collect(self):
+        """ 回收不可达的节点，并清空演化结果缓存 """
+        kept = {}
+        stack = [self.root, *self.empties]
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key not in kept:
+                kept[key] = node
+                stack.extend(key)
+        self.nodes = kept
+        self.results = {}
+        self.gc_count += 1
+
+    def jump(self, j):
+        """ 整个平面演化 2 ** j 代 """
+        if self.cache_size > self.max_nodes:
+            self.collect()
+        node = self.root
+        # 扩大到足够大，保证 2 ** j 代内细胞不会越出节点范围
+        while node.level < j + 2 or not self.is_padded(node):
+            node = self.centre(node)
+        self.root = self.successor(self.centre(node), j)
+
+    def step(self, num=1):
+        remain, j = num, 0
+        while remain:
+            if remain & 1:
+                self.jump(j)
+            remain >>= 1
+            j += 1
+        self.generation += num
+
+    def get_cell(self, x, y) -> bool:
+        node = self.root
+        half = 1 << (node.level - 1)
+        if not (-half <= x < half and -half <= y < half):
+            return False
+        x, y = x + half, y + half
+        while node.level > 0 and node.population > 0:
+            half = 1 << (node.level - 1)
+            if y < half:
+                node = node.nw if x < half else node.ne
+            else:
+                node = node.sw if x < half else node.se
+            x, y = x % half, y % half
+        return node.population == 1
+
+    def set_cell(self, x, y, alive):
+        if self.get_cell(x, y) == bool(alive):
+            return
+        half = 1 << (self.root.level - 1)
+        while not (-half <= x < half and -half <= y < half):
+            self.root = self.centre(self.root)
+            half <<= 1
+        leaf = LIVE_LEAF if alive else DEAD_LEAF
+        self.root = self.set_leaf(self.root, x + half, y + half, leaf)
+
+    def set_leaf(self, node, x, y, leaf) -> QuadNode:
+        """ 替换节点内(x, y)处的叶子，返回新的规范节点 """
+        if node.level == 0:
+            return leaf
+        half = 1 << (node.level - 1)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        if y < half:
+            if x < half:
+                nw = self.set_leaf(nw, x, y, leaf)
+            else:
+                ne = self.set_leaf(ne, x - half, y, leaf)
+        elif x < half:
+            sw = self.set_leaf(sw, x, y - half, leaf)
+        else:
+            se = self.set_leaf(se, x - half, y - half, leaf)
+        return self.join(nw, ne, sw, se)
+
+    def to_grid(self, x=0, y=0, col_count=None, row_count=None) -> [[bool]]:
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        grid = [[False] * col_count for _ in range(row_count)]
+        for cx, cy in self.live_cells(x, y, col_count, row_count):
+            grid[cy][cx] = True
+        return grid
+
+    def live_cells(self, x=0, y=0, col_count=None, row_count=None):
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        cells = []
+        half = 1 << (self.root.level - 1)
+        view = (x, y, x + col_count, y + row_count)
+        self.collect_cells(self.root, -half, -half, cells, view)
+        cells.sort(key=lambda cell: (cell[1], cell[0]))
+        return cells
+
+    def collect_cells(self, node, left, top, cells, view):
+        """ 把节点中落在视口内的存活细胞坐标加入cells，跳过空白节点 """
+        x0, y0, x1, y1 = view
+        size = 1 << node.level
+        if (
+                node.population == 0
+                or left >= x1 or top >= y1
+                or left + size <= x0 or top + size <= y0
+        ):
+            return
+        if node.level == 0:
+            cells.append((left - x0, top - y0))
+            return
+        half = size >> 1
+        self.collect_cells(node.nw, left, top, cells, view)
+        self.collect_cells(node.ne, left + half, top, cells, view)
+        self.collect_cells(node.sw, left, top + half, cells, view)
+        self.collect_cells(node.se, left + half, top + half, cells, view)
+
+    @property
+    def population(self) -> int:
+        return self.root.population
+
+
+class SparseEngine(LifeEngine):
+    """ 只保存存活细胞坐标的稀疏实现，每代的开销只与细胞数量有关
+
+    坐标打包成一个整数作为集合元素，相邻单元格的差值是固定的，
+    统计邻居时只需把8个偏移量分别加到所有存活细胞上。
+    unbounded为True时在无边界的平面上演化，否则棋盘外的细胞全部死亡。
+    """
+    name = "sparse"
+    stride = 1 << 32  # 每行占用的编码空间，坐标范围为 ±2 ** 31
+    origin = (1 << 31) * ((1 << 32) + 1)  # 坐标(0, 0)的编码
+
+    def __init__(self, col_count, row_count, unbounded=False):
+        self.unbounded = unbounded
+        super().__init__(col_count, row_count)
+        s = self.stride
+        self.offsets = (-s - 1, -s, -s + 1, -1, 1, s - 1, s, s + 1)
+
+    def reset(self):
+        self.live = set()
+        self.generation = 0
+
+    def encode(self, x, y) -> int:
+        """ 坐标打包为整数 """
+        return self.origin + y * self.stride + x
+
+    def decode(self, key) -> (int, int):
+        """ 整数还原为坐标 """
+        y, x = divmod(key - self.origin + (self.stride >> 1), self.stride)
+        return x - (self.stride >> 1), y
+
+    def get_cell(self, x, y) -> bool:
+        return self.encode(x, y) in self.live
+
+    def set_cell(self, x, y, alive):
+        if not self.unbounded and not (
+                0 <= x < self.col_count and 0 <= y < self.row_count
+        ):
+            return
+        if alive:
+            self.live.add(self.encode(x, y))
+        else:
+            self.live.discard(self.encode(x, y))
+
+    def step(self, num=1):
+        for _ in range(num):
+            live = self.live
+            counts = Counter()
+            for offset in self.offsets:
+                counts.update(map(offset.__add__, live))
+            self.live = {
+                key for key, n in counts.items()
+                if n == 3 or (n == 2 and key in live)
+            }
+            if not self.unbounded:
+                self.live = {
+                    key for key in self.live if self.on_board(key)
+                }
+        self.generation += num
+
+    def on_board(self, key) -> bool:
+        """ 细胞是否在棋盘范围内 """
+        x, y = self.decode(key)
+        return 0 <= x < self.col_count and 0 <= y < self.row_count
+
+    def window_cells(self, x, y, col_count, row_count):
+        """ 找出落在窗口内的存活细胞，返回相对窗口左上角的坐标 """
+        for key in self.live:
+            cx, cy = self.decode(key)
+            cx, cy = cx - x, cy - y
+            if 0 <= cx < col_count and 0 <= cy < row_count:
+                yield cx, cy
+
+    def to_grid(self, x=0, y=0, col_count=None, row_count=None) -> [[bool]]:
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        grid = [[False] * col_count for _ in range(row_count)]
+        for cx, cy in self.window_cells(x, y, col_count, row_count):
+            grid[cy][cx] = True
+        return grid
+
+    def live_cells(self, x=0, y=0, col_count=None, row_count=None):
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        cells = self.window_cells(x, y, col_count, row_count)
+        return sorted(cells, key=lambda cell: (cell[1], cell[0]))
+
+    @property
+    def population(self) -> int:
+        return len(self.live)
+
+
+class BitPackedEngine(LifeEngine):
+    """ 位压缩实现，每行存为一个整数，第x位表示第x列
+
+    邻居数量用全加器按位并行计算，一次运算处理整行，
+    每个单元格只占1个二进制位。
+    """
+    name = "bitpacked"
+
+    def reset(self):
+        self.mask = (1 << self.col_count) - 1
+        self.rows = [0] * self.row_count
+        self.generation = 0
+
+    def get_cell(self, x, y) -> bool:
+        if not (0 <= x < self.col_count and 0 <= y < self.row_count):
+            return False
+        return (self.rows[y] >> x) & 1 == 1
+
+    def set_cell(self, x, y, alive):
+        # 超出mask的位会在演化时移回最右一列，棋盘外的细胞直接忽略
+        if not (0 <= x < self.col_count and 0 <= y < self.row_count):
+            return
+        if alive:
+            self.rows[y] |= 1 << x
+        else:
+            self.rows[y] &= ~(1 << x)
+
+    def get_row(self, y, x=0, count=None) -> [bool]:
+        if count is None:
+            count = self.col_count - x
+        bits = (self.rows[y] >> x) & ((1 << count) - 1)
+        return [c == "1" for c in reversed(f"{bits:0{count}b}")]
+
+    def to_grid(self, x=0, y=0, col_count=None, row_count=None) -> [[bool]]:
+        if row_count is None:
+            row_count = self.row_count - y
+        return [self.get_row(y + dy, x, col_count) for dy in range(row_count)]
+
+    def live_cells(self, x=0, y=0, col_count=None, row_count=None):
+        if col_count is None:
+            col_count = self.col_count - x
+        if row_count is None:
+            row_count = self.row_count - y
+        cells = []
+        window = (1 << col_count) - 1
+        for dy in range(row_count):
+            bits = (self.rows[y + dy] >> x) & window
+            while bits:
+                # 每次取出最低位的存活细胞
+                low = bits & -bits
+                cells.append((low.bit_length() - 1, dy))
+                bits ^= low
+        return cells
+
+    def load_grid(self, grid, x=0, y=0):
+        for dy, row in enumerate(grid):
+            bits = width = 0
+            for dx, alive in enumerate(row):
+                if alive:
+                    bits |= 1 << dx
+                width = dx + 1
+            row_mask = ((1 << width) - 1) << x
+            self.rows[y + dy] = (
+                self.rows[y + dy] & ~row_mask | (bits << x)
+            ) & self.mask
+
+    @property
+    def population(self) -> int:
+        return sum(row.bit_count() for row in self.rows)
+
+    def change_rows(self) -> [int]:
+        """ 计算下一代的所有行 """
+        mask = self.mask
+        padded = [0, *self.rows, 0]
+        next_rows = []
+        for up, row, down in zip(padded, padded[1:], padded[2:]):
+            # 上下两行各自的3个邻居：全加器得到个位和二位
+            ul, ur = (up << 1) & mask, up >> 1
+            up_ones = ul ^ up ^ ur
+            up_twos = (ul & up) | (ur & (ul ^ up))
+            dl, dr = (down << 1) & mask, down >> 1
+            down_ones = dl ^ down ^ dr
+            down_twos = (dl & down) | (dr & (dl ^ down))
+            # 本行的2个邻居：半加器
+            rl, rr = (row << 1) & mask, row >> 1
+            row_ones = rl ^ rr
+            row_twos = rl & rr
+            # 合并个位，进位到二位
+            ones = up_ones ^ down_ones ^ row_ones
+            carry = (up_ones & down_ones) | (row_ones & (up_ones ^ down_ones))
+            # 二位上共有4个输入，总和恰好为1时邻居数为2或3
+            twos = up_twos ^ down_twos ^ row_twos
+            fours = (
+                (up_twos & down_twos) | (row_twos & (up_twos ^ down_twos))
+            )
+            two_or_three = (twos ^ carry) & ~(fours | (twos & carry))
+            next_rows.append(two_or_three & (ones | row))
+        return next_rows
+
+    def step(self, num=1):
+        for _ in range(num):
+            self.rows = self.change_rows()
+        self.generation += num
+
+
+ENGINES = {
+    ListEngine.name: ListEngine,
+    NumpyEngine.name: NumpyEngine,
+    HashLifeEngine.name: HashLifeEngine,
+    SparseEngine.name: SparseEngine,
+    BitPackedEngine.name: BitPackedEngine,
+    ParallelEngine.name: ParallelEngine,
+    TiledEngine.name: TiledEngine,
+}
+DEFAULT_ENGINE = NumpyEngine.name if np is not None else ListEngine.name
+
+
+def create_engine(name, col_count, row_count, **kwargs) -> LifeEngine:
+    """ 按名称创建演化引擎 """
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            "Unknown life engine {!r}, choose from: {}".format(
+                name, ", ".join(ENGINES)
+            )
+        )
+    return engine_class(col_count, row_count, **kwargs)
+
+
+def benchmark(name, col_count, row_count, num=10, density=0.3, seed=0,
+              **kwargs) -> float:
+    """ 随机填充棋盘后演化num代，返回每秒演化的代数 """
+    rand = random.Random(seed)
+    engine = create_engine(name, col_count, row_count, **kwargs)
+    try:
+        for y in range(row_count):
+            engine.load_grid(
+                [[rand.random() < density for _ in range(col_count)]], 0, y
+            )
+        started = time.perf_counter()
+        engine.step(num)
+        return num / (time.perf_counter() - started)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    # 并行引擎的扩展性测试
+    size = 4096
+    base = benchmark(NumpyEngine.name, size, size)
+    print(f"{NumpyEngine.name:>10}: {base:8.2f} gens/s")
+    for workers in (1, 2, 4, 8):
+        speed = benchmark(ParallelEngine.name, size, size, workers=workers)
+        print(
+            f"{workers:>2} workers: {speed:8.2f} gens/s, "
+            f"{speed / base:.2f}x"
+        )
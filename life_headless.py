@@ -0,0 +1,169 @@
+""" 无界面运行细胞演化，用于性能测试和比较各个引擎
+
+    python -m life --headless --pattern gun.rle --gens 1000 --engine numpy
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+
+import life_engine
+import life_pattern
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，无法统计内存峰值
+    resource = None
+
+HEADLESS_FLAG = "--headless"
+DEFAULT_WIDTH, DEFAULT_HEIGHT = 1000, 1000
+
+
+def parse_option(text) -> (str, object):
+    """ 解析KEY=VALUE形式的引擎参数，数字和true/false会被转换 """
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {text!r}")
+    if value.lower() in ("true", "false"):
+        return key, value.lower() == "true"
+    try:
+        return key, int(value)
+    except ValueError:
+        return key, value
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="life", description="细胞分裂")
+    parser.add_argument(HEADLESS_FLAG, action="store_true",
+                        help="不打开窗口，只演化并输出性能数据")
+    parser.add_argument("--engine", default=life_engine.DEFAULT_ENGINE,
+                        choices=sorted(life_engine.ENGINES),
+                        help="演化引擎")
+    parser.add_argument("-o", "--option", action="append", default=[],
+                        type=parse_option, metavar="KEY=VALUE",
+                        help="传给引擎的参数，例如 workers=4")
+    parser.add_argument("--pattern", help="RLE或.cells图案文件")
+    parser.add_argument("--x", type=int, default=0, help="图案放置的列")
+    parser.add_argument("--y", type=int, default=0, help="图案放置的行")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT)
+    parser.add_argument("--density", type=float, default=0.3,
+                        help="没有图案时随机填充的比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机填充的种子")
+    parser.add_argument("--gens", type=int, default=100, help="演化的代数")
+    parser.add_argument("--checksum", action="store_true",
+                        help="输出最终状态的校验和")
+    parser.add_argument("--json", action="store_true",
+                        help="以一行JSON输出结果，便于CI比较")
+    return parser
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    return make_parser().parse_args(argv)
+
+
+def fill_random(engine, density, seed):
+    """ 按比例随机填充整个棋盘 """
+    rand = random.Random(seed)
+    for y in range(engine.row_count):
+        row = [rand.random() < density for _ in range(engine.col_count)]
+        engine.load_grid([row], 0, y)
+
+
+def checksum(engine) -> str:
+    """ 棋盘内所有单元格的校验和，与引擎的实现无关 """
+    digest = hashlib.sha1()
+    digest.update(f"{engine.col_count}x{engine.row_count}".encode())
+    for y in range(engine.row_count):
+        digest.update(bytes(engine.get_row(y)))
+    return digest.hexdigest()
+
+
+def peak_rss(children=False) -> int | None:
+    """ 主进程的内存峰值，单位为字节
+
+    children为True时返回已经退出的子进程中最大的峰值，不是所有子进程之和。
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux下单位为KB，macOS下为字节
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run(args) -> dict:
+    """ 按参数创建引擎并演化，返回性能数据 """
+    engine = life_engine.create_engine(
+        args.engine, args.width, args.height, **dict(args.option)
+    )
+    try:
+        if args.pattern:
+            life_pattern.load_pattern(args.pattern, engine, args.x, args.y)
+        else:
+            fill_random(engine, args.density, args.seed)
+        started = time.perf_counter()
+        engine.step(args.gens)
+        elapsed = time.perf_counter() - started
+        result = {
+            "engine": args.engine,
+            "width": args.width,
+            "height": args.height,
+            "gens": args.gens,
+            "seconds": elapsed,
+            "gens_per_second": args.gens / elapsed if elapsed else None,
+            "cells_per_second": (
+                args.gens * args.width * args.height / elapsed
+                if elapsed else None
+            ),
+            "population": engine.population,
+            "peak_rss": peak_rss(),
+        }
+        if args.checksum:
+            result["checksum"] = checksum(engine)
+        has_workers = bool(getattr(engine, "processes", None))
+    finally:
+        engine.close()
+    # 并行引擎的工作进程在close()中退出，之后才能统计
+    result["peak_worker_rss"] = peak_rss(children=True) if has_workers else None
+    return result
+
+
+def format_result(result) -> str:
+    lines = [
+        f"engine:      {result['engine']} "
+        f"({result['width']}x{result['height']})",
+        f"generations: {result['gens']} in {result['seconds']:.3f}s",
+    ]
+    if result["gens_per_second"] is not None:
+        lines.append(f"gens/s:      {result['gens_per_second']:.2f}")
+        lines.append(f"cells/s:     {result['cells_per_second']:.4g}")
+    lines.append(f"population:  {result['population']}")
+    if result["peak_rss"] is not None:
+        lines.append(
+            f"peak RSS:    {result['peak_rss'] / 2 ** 20:.1f} MiB (main process)"
+        )
+    if result["peak_worker_rss"] is not None:
+        lines.append(
+            f"worker RSS:  {result['peak_worker_rss'] / 2 ** 20:.1f} MiB"
+            " (largest worker)"
+        )
+    if "checksum" in result:
+        lines.append(f"checksum:    {result['checksum']}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(format_result(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+""" 细胞图案的导入导出，支持RLE和plaintext(.cells)两种常见格式
+
+读取时逐行解析文件，图案直接写入演化引擎，不需要先把整个文件读成字符串；
+写出时只取出存活细胞，逐行合并成片段，边编码边写入文件。
+"""
+import itertools
+import os
+import re
+
+RLE_TOKEN = re.compile(r"(\d*)([^\d\s])")
+RLE_HEADER = re.compile(r"\s*x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)")
+RLE_LINE_WIDTH = 70  # RLE文件每行最多的字符数
+CELLS_ALIVE = "O*"
+
+
+class PatternWriter:
+    """ 把数据块写入文件，每行不超过width个字符，数据块不会被拆开 """
+
+    def __init__(self, file, width=RLE_LINE_WIDTH):
+        self.file = file
+        self.width = width
+        self.column = 0
+
+    def write(self, token):
+        if self.column and self.column + len(token) > self.width:
+            self.file.write("\n")
+            self.column = 0
+        self.file.write(token)
+        self.column += len(token)
+
+    def end(self):
+        self.file.write("\n")
+        self.column = 0
+
+
+def make_setter(engine, x, y):
+    """ 返回将图案坐标的存活细胞写入引擎的函数，有边界的引擎忽略棋盘外的细胞 """
+
+    def set_alive(px, py):
+        cx, cy = x + px, y + py
+        if engine.unbounded or (
+                0 <= cx < engine.col_count and 0 <= cy < engine.row_count
+        ):
+            engine.set_cell(cx, cy, True)
+
+    return set_alive
+
+
+def read_rle(file, engine, x=0, y=0) -> (int, int):
+    """ 解析RLE格式，把存活细胞放到引擎中(x, y)开始的位置，返回图案的宽和高 """
+    set_alive = make_setter(engine, x, y)
+    width = height = 0
+    px = py = 0
+    pending = ""  # 上一行末尾未结束的数字
+    for line in file:
+        if not pending:
+            if line.startswith("#"):
+                continue
+            header = RLE_HEADER.match(line)
+            if header:
+                width, height = int(header.group(1)), int(header.group(2))
+                continue
+        end = 0
+        for match in RLE_TOKEN.finditer(line):
+            digits, tag = pending + match.group(1), match.group(2)
+            pending = ""
+            end = match.end()
+            count = int(digits) if digits else 1
+            if tag == "!":
+                return width, height
+            if tag == "$":
+                px, py = 0, py + count
+            elif tag in "b.":
+                px += count
+            elif tag.isalpha():
+                # 多状态规则中的其他字母也视为存活
+                for i in range(count):
+                    set_alive(px + i, py)
+                px += count
+            else:
+                raise ValueError(f"Invalid RLE token {tag!r} in line {line!r}")
+        rest = line[end:].strip()
+        if rest.isdigit():
+            pending += rest
+    return width, height
+
+
+def read_cells(file, engine, x=0, y=0) -> (int, int):
+    """ 解析plaintext格式，把存活细胞放到引擎中(x, y)开始的位置，返回图案的宽和高 """
+    set_alive = make_setter(engine, x, y)
+    width = height = 0
+    for line in file:
+        if line.startswith("!"):
+            continue
+        line = line.rstrip("\r\n")
+        for px, c in enumerate(line):
+            if c in CELLS_ALIVE:
+                set_alive(px, height)
+        width = max(width, len(line))
+        height += 1
+    return width, height
+
+
+def iter_rows(engine, x, y, col_count, row_count):
+    """ 逐行取出区域内存活细胞的列号，跳过没有存活细胞的行 """
+    cells = engine.live_cells(x, y, col_count, row_count)
+    for row_index, group in itertools.groupby(cells, key=lambda c: c[1]):
+        yield row_index, [px for px, _ in group]
+
+
+def iter_runs(columns):
+    """ 把一行存活细胞的列号合并为(是否存活, 长度)的片段，行尾的死细胞不算 """
+    end = 0  # 上一个存活片段的结束位置
+    for _, group in itertools.groupby(
+            enumerate(columns), key=lambda item: item[1] - item[0]
+    ):
+        run = [px for _, px in group]
+        if run[0] > end:
+            yield False, run[0] - end
+        yield True, len(run)
+        end = run[-1] + 1
+
+
+def write_rle(file, engine, x=0, y=0, col_count=None, row_count=None):
+    """ 把(x, y)开始的区域按RLE格式写入文件 """
+    if col_count is None:
+        col_count = engine.col_count - x
+    if row_count is None:
+        row_count = engine.row_count - y
+    file.write(f"x = {col_count}, y = {row_count}, rule = B3/S23\n")
+    writer = PatternWriter(file)
+    current = 0  # 已经换行到的行号
+    for row_index, columns in iter_rows(engine, x, y, col_count, row_count):
+        if row_index > current:
+            lines = row_index - current
+            writer.write(f"{lines}$" if lines > 1 else "$")
+            current = row_index
+        for alive, count in iter_runs(columns):
+            tag = "o" if alive else "b"
+            writer.write(f"{count}{tag}" if count > 1 else tag)
+    writer.write("!")
+    writer.end()
+
+
+def write_cells(file, engine, x=0, y=0, col_count=None, row_count=None):
+    """ 把(x, y)开始的区域按plaintext格式写入文件 """
+    if row_count is None:
+        row_count = engine.row_count - y
+    current = 0  # 已经写出的行数
+    for row_index, columns in iter_rows(engine, x, y, col_count, row_count):
+        file.write(".\n" * (row_index - current))
+        file.write("".join(
+            ("O" if alive else ".") * count
+            for alive, count in iter_runs(columns)
+        ) + "\n")
+        current = row_index + 1
+    file.write(".\n" * (row_count - current))
+
+
+READERS = {".rle": read_rle, ".cells": read_cells}
+WRITERS = {".rle": write_rle, ".cells": write_cells}
+
+
+def get_format(path, formats):
+    """ 按文件扩展名选择读写函数 """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        return formats[ext]
+    except KeyError:
+        raise ValueError(
+            "Unknown pattern format {!r}, choose from: {}".format(
+                ext, ", ".join(formats)
+            )
+        )
+
+
+def load_pattern(path, engine, x=0, y=0) -> (int, int):
+    """ 读取图案文件放到引擎中(x, y)开始的位置 """
+    reader = get_format(path, READERS)
+    with open(path, "r") as f:
+        return reader(f, engine, x, y)
+
+
+def save_pattern(path, engine, x=0, y=0, col_count=None, row_count=None):
+    """ 把引擎中(x, y)开始的区域保存为图案文件 """
+    writer = get_format(path, WRITERS)
+    with open(path, "w") as f:
+        writer(f, engine, x, y, col_count, row_count)
@@ -1,12 +1,23 @@
+import atexit
+import hashlib
 import math
-from random import sample
+import random
+import sys
 
-import pgzrun
 import pygame.font
 from pgzero.constants import mouse
-from pygame.constants import K_SPACE
+from pgzero.loaders import images
+from pygame.constants import K_SPACE, K_h
 
 import board
+import mine_log
+import mine_probability
+from neighbors import count_neighbors
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，缺失时逐个地雷累加
+    np = None
 
 # 单元格大小，由图片素材大小决定，底部信息栏高度与字体相关
 CELL_SIZE, INFO_HEIGHT = 18, 30
@@ -15,100 +26,330 @@ X_COUNT, Y_COUNT = 19, 14
 
 BACK_COLOR = (212, 212, 212)
 TEXT_COLOR = (240, 165, 32)
+HINT_ALPHA = 120  # 地雷概率提示的不透明度
+
+
+# 单元格状态编码，按字节保存在MineBoard.states中
+COVERED, FLAG, QUESTION, UNCOVERED = range(4)
+STATE_NAMES = ("covered", "flag", "question", "uncovered")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+# 右键点击后的下一个状态
+NEXT_STATE = (FLAG, QUESTION, COVERED, COVERED)
+
+
+def sample_indexes(rng, population, k, exclude=()) -> set:
+    """ 从range(population)中去掉exclude后，等概率地不重复抽取k个数
+
+    使用Floyd算法，只需O(k)的时间和内存，不用生成整个候选列表。
+    """
+    exclude = sorted(set(exclude))
+    size = population - len(exclude)
+    chosen = set()
+    for j in range(size - k, size):
+        t = rng.randrange(j + 1)
+        chosen.add(j if t in chosen else t)
+    if not exclude:
+        return chosen
+    # 把[0, size)映射回去，跳过被排除的数
+    result = set()
+    for i in chosen:
+        for e in exclude:
+            if i >= e:
+                i += 1
+            else:
+                break
+        result.add(i)
+    return result
 
 
 class Cell:
-    """ 棋盘格子 """
-    is_mime = False
-    state = "covered"
-    count = -1
+    """ 棋盘格子，只是棋盘中各个数组同一位置的视图 """
+    __slots__ = ("board", "index", "x", "y")
 
-    def __init__(self, y, x):
-        self.y = y
+    def __init__(self, board, x, y):
+        self.board = board
         self.x = x
+        self.y = y
+        self.index = board.get_index(x, y)
+
+    @property
+    def is_mime(self) -> bool:
+        return self.board.mines[self.index] == 1
+
+    @is_mime.setter
+    def is_mime(self, value):
+        self.board.mines[self.index] = 1 if value else 0
+
+    @property
+    def state(self) -> str:
+        return STATE_NAMES[self.board.states[self.index]]
+
+    @state.setter
+    def state(self, value):
+        self.board.states[self.index] = STATE_CODES[value]
+
+    @property
+    def count(self) -> int:
+        return self.board.counts[self.index]
+
+    @count.setter
+    def count(self, value):
+        self.board.counts[self.index] = value
 
     def reset(self):
         self.is_mime = False
         self.state = "covered"
-        self.count = -1
+        self.count = 0
 
     def is_complete(self) -> bool:
         return self.state == "uncovered" or self.is_mime
 
     def next_state(self) -> str:
         """ 切换到下一个状态 """
-        if self.state == "covered":
-            self.state = "flag"
-        elif self.state == "flag":
-            self.state = "question"
-        else:
-            self.state = "covered"
+        states = self.board.states
+        states[self.index] = NEXT_STATE[states[self.index]]
         return self.state
 
 
+class MineRenderer:
+    """ 保存一张画好的棋盘图像，重开游戏时全部重画，之后只重画有变化的单元格 """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.surface = None
+        self.images = {}
+        self.font = None
+        self.info_text = None
+        self.info = None
+        self.hint_source = None
+        self.hint = None
+
+    def get_image(self, name) -> pygame.Surface:
+        """ 图片只加载一次，之后直接使用 """
+        image = self.images.get(name)
+        if image is None:
+            image = self.images[name] = images.load(name)
+        return image
+
+    def render(self, board) -> pygame.Surface:
+        """ 画出棋盘中有变化的单元格并返回图像 """
+        size = (
+            board.col_count * self.cell_size, board.row_count * self.cell_size
+        )
+        if (
+                self.surface is None or self.surface.get_size() != size
+                or board.changed_all
+        ):
+            self.surface = pygame.Surface(size)
+            for index in range(board.col_count * board.row_count):
+                self.draw_cell(board, index)
+        else:
+            for index in board.changed:
+                self.draw_cell(board, index)
+        board.changed.clear()
+        board.changed_all = False
+        return self.surface
+
+    def draw_cell(self, board, index):
+        """ 按单元格的状态画出一个单元格 """
+        x, y = board.get_position(index)
+        pos = (x * self.cell_size, y * self.cell_size)
+
+        def draw(name):
+            self.surface.blit(self.get_image(name), pos)
+
+        state = board.states[index]
+        if state != UNCOVERED:
+            draw("covered")
+            if state == FLAG:
+                draw("flag")
+            elif state == QUESTION:
+                draw("question")
+        elif board.mines[index] and board.game_over:
+            draw("uncovered")
+            draw("flower")
+        else:
+            draw("uncovered")
+            if board.counts[index] > 0:
+                draw(str(board.counts[index]))
+
+    def render_hint(self, board, probabilities) -> pygame.Surface:
+        """ 把每个未点开单元格是地雷的概率画成半透明的颜色，越红越可能是地雷 """
+        if probabilities is not self.hint_source:
+            size = self.cell_size
+            self.hint = pygame.Surface(
+                (board.col_count * size, board.row_count * size),
+                pygame.SRCALPHA
+            )
+            for index, p in probabilities.items():
+                x, y = board.get_position(index)
+                color = (round(255 * p), round(255 * (1 - p)), 0, HINT_ALPHA)
+                self.hint.fill(color, (x * size, y * size, size, size))
+            self.hint_source = probabilities
+        return self.hint
+
+    def render_info(self, text, font=None) -> pygame.Surface:
+        """ 信息栏文字没有变化时直接使用上次的图像 """
+        if font is None:
+            if self.font is None:
+                self.font = pygame.font.Font(None, 32)
+            font = self.font
+        if text != self.info_text or font is not self.font:
+            self.info = font.render(text, True, TEXT_COLOR)
+            self.info_text = text
+        return self.info
+
+
 class MineBoard(board.Board):
-    """ 扫雷游戏 """
+    """ 扫雷游戏
+
+    单元格按行编号（见Board.get_index），数据分别存放在三个数组中：
+    mines是否地雷，states状态编码，counts周围地雷数量（埋雷时一次算好）。
+    """
     name = "扫雷"
-    grid = []
+    mines = bytearray()
+    states = bytearray()
+    counts = bytearray()
     mime_remain = 0
     game_over = False  # 游戏结束，如果同时mime_remain==0则是胜利
     first_click = True  # 左键点击第一个单元格
-
-    def __init__(self):
+    safe_zone = False  # 第一次点击的周围8格也不埋雷
+    mime_seed = None  # 本局埋雷用的随机数种子
+    safe_remain = 0  # 还没点开的非地雷单元格数量，为0时全部完成
+    changed_all = True  # 下一帧需要重画所有单元格
+    show_hint = False  # 在未点开的单元格上显示是地雷的概率
+    probabilities = None  # {单元格序号: 地雷概率}，棋盘变化后重新计算
+    recorder = None  # 记录操作的mine_log.LogRecorder
+
+    def __init__(self, seed=None, safe_zone=None):
+        self.rng = random.Random(seed)
+        self.renderer = MineRenderer(CELL_SIZE)
+        self.prober = None
+        if safe_zone is not None:
+            self.safe_zone = safe_zone
         super().__init__(CELL_SIZE, X_COUNT, Y_COUNT, INFO_HEIGHT)
 
     def reset(self):
         """ 重开游戏，埋雷推迟到第一次点击 """
-        self.grid = [
-            [Cell(y, x) for x in range(self.col_count)]
-            for y in range(self.row_count)
-        ]
+        cell_count = self.col_count * self.row_count
+        self.mines = bytearray(cell_count)
+        self.states = bytearray(cell_count)  # 全部为COVERED
+        self.counts = bytearray(cell_count)
         self.mime_remain = 0
         self.game_over = False
         self.first_click = True
+        self.mime_seed = None
+        self.safe_remain = cell_count
+        self.changed = set()  # 上一帧之后状态变化的单元格
+        self.changed_all = True
 
     def get_cell(self, x, y) -> Cell | None:
-        try:
-            return self.grid[y][x]
-        except IndexError:
-            return None
+        if 0 <= x < self.col_count and 0 <= y < self.row_count:
+            return Cell(self, x, y)
+        return None
 
     def get_near_cells(self, x, y) -> [Cell]:
         """ 找出周围（最多）8个单元格 """
         for x, y in self.get_neighbor_cells(x, y):
-            yield self.get_cell(x, y)
+            yield Cell(self, x, y)
 
     def get_surrounding_mime_count(self, x, y) -> int:
-        """ 获取周围8格地雷数量，缓存在当前单元格中 """
-        cell = self.get_cell(x, y)
-        if cell.count < 0:
-            cell.count = sum(
-                1 for c in self.get_near_cells(x, y) if c.is_mime
+        """ 获取周围8格地雷数量，埋雷时已经算好 """
+        return self.counts[self.get_index(x, y)]
+
+    def scan_mime_count(self, x, y) -> int:
+        """ 逐个检查周围8格得到地雷数量，只用于校验counts """
+        mines = self.mines
+        return sum(
+            mines[i] for i in self.get_neighbor_indexes(self.get_index(x, y))
+        )
+
+    def check_counts(self) -> bool:
+        """ 调试用，检查counts与逐格统计的结果是否一致 """
+        return all(
+            self.counts[self.get_index(x, y)] == self.scan_mime_count(x, y)
+            for y in range(self.row_count) for x in range(self.col_count)
+        )
+
+    def count_mines(self):
+        """ 埋雷后一次算出所有单元格周围的地雷数量 """
+        if np is not None:
+            # 四周补一圈0，8个方向错位的切片相加
+            mines = np.frombuffer(self.mines, dtype=np.uint8).reshape(
+                self.row_count, self.col_count
             )
-        return cell.count
-
-    def set_mime_cells(self, sx=-1, sy=-1):
-        """ 埋雷，数量为总单元格数的1/7 """
+            counts = count_neighbors(np.pad(mines, 1))
+            self.counts = bytearray(counts.tobytes())
+            return
+        # 每个地雷给周围8格各加1
+        counts = bytearray(len(self.mines))
+        for index, is_mime in enumerate(self.mines):
+            if is_mime:
+                for i in self.get_neighbor_indexes(index):
+                    counts[i] += 1
+        self.counts = counts
+
+    def set_mime_cells(self, sx=-1, sy=-1, seed=None):
+        """ 埋雷，数量为总单元格数的1/7
+
+        (sx, sy)肯定不是地雷，safe_zone为True时它周围8格也不是。
+        seed决定地雷位置，不指定时由self.rng生成，实际使用的值保存在mime_seed中，
+        同样的seed和第一次点击的位置总是得到同样的棋盘。
+        """
         cell_count = self.col_count * self.row_count
-        self.mime_remain = int(math.ceil(cell_count / 7))
-        exclude = sx * self.row_count + sy
-        # 筛选两次，让地雷更为分散
-        indexes = [i for i in range(cell_count) if i != exclude]
-        indexes = sample(indexes, self.mime_remain * 3)
-        for i in sample(indexes, self.mime_remain):
-            x, y = i // self.row_count, i % self.row_count
-            self.get_cell(x, y).is_mime = True
-
-    def open_more_cells(self, stack):
-        """ 点开当前单元格，如果是鼠标中键点击，同时点开附近八格 """
-        while stack:
-            x, y = stack.pop()
-            self.get_cell(x, y).state = "uncovered"
-            if self.get_surrounding_mime_count(x, y) > 0:
+        exclude = []
+        if 0 <= sx < self.col_count and 0 <= sy < self.row_count:
+            index = self.get_index(sx, sy)
+            exclude.append(index)
+            if self.safe_zone:
+                exclude.extend(self.get_neighbor_indexes(index))
+        self.mime_remain = min(
+            int(math.ceil(cell_count / 7)), cell_count - len(exclude)
+        )
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.mime_seed = seed
+        if self.recorder is not None:
+            self.recorder.seed(seed)
+        rng = random.Random(seed)
+        for i in sample_indexes(rng, cell_count, self.mime_remain, exclude):
+            self.mines[i] = 1
+        self.count_mines()
+        self.safe_remain = sum(
+            1 for is_mime, state in zip(self.mines, self.states)
+            if not is_mime and state != UNCOVERED
+        )
+
+    def open_more_cells(self, stack) -> [int]:
+        """ 点开当前单元格，如果是鼠标中键点击，同时点开附近八格
+
+        周围没有地雷的单元格继续点开它周围的单元格。单元格在入栈前就标记为
+        点开，状态数组同时充当访问标记，每个单元格最多处理一次。
+        返回本次点开的单元格序号列表，供只重画变化部分使用。
+        """
+        states, counts, mines = self.states, self.counts, self.mines
+        neighbors = self.neighbor_table.neighbors
+        opened = []
+        pending = []
+        for x, y in stack:
+            index = self.get_index(x, y)
+            if states[index] != UNCOVERED:
+                states[index] = UNCOVERED
+                opened.append(index)
+                pending.append(index)
+        while pending:
+            index = pending.pop()
+            if counts[index] > 0:
                 continue
-            for c in self.get_near_cells(x, y):
-                if c.state in ("covered", "question"):
-                    stack.append((c.x, c.y))
+            for i in neighbors(index):
+                if states[i] == COVERED or states[i] == QUESTION:
+                    states[i] = UNCOVERED
+                    opened.append(i)
+                    pending.append(i)
+        # 中键点击可能会点开地雷，只统计非地雷单元格
+        self.safe_remain -= len(opened) - sum(mines[i] for i in opened)
+        self.changed.update(opened)
+        return opened
 
     def on_right_clicked(self, cell):
         """ 鼠标右键点击 """
@@ -116,6 +357,7 @@ class MineBoard(board.Board):
             return
         # 处理右键点击，切换单元格状态
         state = cell.next_state()
+        self.changed.add(cell.index)
         if state == "flag":
             self.mime_remain -= 1
         elif state == "question":
@@ -123,6 +365,12 @@ class MineBoard(board.Board):
 
     def on_clicked(self, button, mouse_x, mouse_y):
         """ 鼠标（包括左、中、右）点击操作 """
+        if self.recorder is not None:
+            # 拖到窗口外松开时坐标可能为负，日志中只能保存非负数，
+            # 限制在棋盘内不会改变点中的单元格
+            mouse_x = min(max(mouse_x, 0), self.col_count * self.cell_size - 1)
+            mouse_y = min(max(mouse_y, 0), self.row_count * self.cell_size - 1)
+            self.recorder.click(button, mouse_x, mouse_y)
         if self.game_over:
             self.reset()
             return
@@ -130,12 +378,33 @@ class MineBoard(board.Board):
         # 将鼠标点击坐标转化为对应位置的单元格
         sx, sy = self.get_mouse_loc(mouse_x, mouse_y)
         # print("mouse:", button, sx, sy)
+        opened = self.click_cell(button, sx, sy)
+        if self.game_over and self.recorder is not None:
+            # 每局结束时记下棋盘状态，回放时用来校验
+            self.recorder.check(self.state_hash())
+        return opened
+
+    def on_pressed(self, key):
+        """ 键盘操作 """
+        if self.recorder is not None:
+            self.recorder.key(key)
+        # 按下空格键重置游戏
+        if key == K_SPACE:
+            self.reset()
+        # 按下H键显示或隐藏地雷概率
+        elif key == K_h:
+            self.toggle_hint()
+
+    def click_cell(self, button, sx, sy) -> [int]:
+        """ 点击(sx, sy)处的单元格，左键或中键点击时返回点开的单元格序号 """
         sel_cell = self.get_cell(sx, sy)
+        if sel_cell is None:
+            return []
 
         if button == mouse.RIGHT:
             return self.on_right_clicked(sel_cell)
         if sel_cell.state == "flag":
-            return
+            return []
 
         if self.first_click:
             self.first_click = False
@@ -146,92 +415,135 @@ class MineBoard(board.Board):
         if sel_cell.is_mime:
             sel_cell.state = "uncovered"
             self.game_over = True
-            return
+            self.changed_all = True  # 所有点开的地雷都要显示出来
+            return [sel_cell.index]
 
         stack = [(sx, sy)]
         if button == mouse.MIDDLE:
             # 中键点击，打开周围8格
-            for c in self.get_near_cells(sx, sy):
-                if c.state == "covered":
-                    stack.append((c.x, c.y))
-        self.open_more_cells(stack)
-
-        if self.mime_remain <= 0:
-            # 检查当前游戏是否完成，即是否胜利
-            complete = all(
-                self.get_cell(x, y).is_complete()
-                for y in range(self.row_count) for x in range(self.col_count)
-            )
-            if complete:
-                self.game_over = True
+            for i in self.get_neighbor_indexes(sel_cell.index):
+                if self.states[i] == COVERED:
+                    stack.append(self.get_position(i))
+        opened = self.open_more_cells(stack)
+
+        if self.mime_remain <= 0 and self.is_complete():
+            self.game_over = True
+            self.changed_all = True
+        return opened
+
+    def state_hash(self) -> bytes:
+        """ 棋盘大小、地雷位置和所有单元格状态的SHA-1 """
+        digest = hashlib.sha1()
+        digest.update(f"{self.col_count}x{self.row_count}".encode())
+        digest.update(self.mines)
+        digest.update(self.states)
+        return digest.digest()
+
+    def record(self, path):
+        """ 重开游戏，把之后的操作追加到日志文件，程序退出时自动结束记录
+
+        日志中每次记录都从全新的棋盘开始，回放时才能得到同样的结果。
+        """
+        self.stop_recording()
+        self.reset()
+        self.recorder = mine_log.LogRecorder(
+            path, self.col_count, self.row_count, self.safe_zone
+        )
+        atexit.register(self.stop_recording)
+
+    def stop_recording(self):
+        """ 记下当前棋盘状态后关闭日志，没有玩完的一局也可以校验 """
+        if self.recorder is not None:
+            self.recorder.close(self.state_hash())
+            self.recorder = None
+            atexit.unregister(self.stop_recording)
+
+    def get_constraints(self) -> ([int], [(tuple, int)], int):
+        """ 玩家能看到的信息，用于计算地雷概率
+
+        返回所有未点开的单元格，每个数字格周围未点开的单元格和地雷数，
+        以及未点开单元格中的地雷总数。旗子可能插错，也当作未点开。
+        """
+        states, counts = self.states, self.counts
+        neighbors = self.neighbor_table.neighbors
+        unknown = [i for i, state in enumerate(states) if state != UNCOVERED]
+        constraints = []
+        for index, state in enumerate(states):
+            if state != UNCOVERED or counts[index] == 0:
+                continue
+            cells = tuple(i for i in neighbors(index) if states[i] != UNCOVERED)
+            if cells:
+                constraints.append((cells, counts[index]))
+        if self.first_click:
+            mine_count = int(math.ceil(len(states) / 7))  # 还没有埋雷
+        else:
+            mine_count = self.mime_remain + states.count(FLAG)
+        return unknown, constraints, mine_count
+
+    def toggle_hint(self):
+        """ 显示或隐藏地雷概率，隐藏期间的变化没有计算，重新显示时要全部重算 """
+        self.show_hint = not self.show_hint
+        self.probabilities = None
+
+    def update_probabilities(self) -> {int: float}:
+        """ 重新计算每个未点开单元格是地雷的概率 """
+        if self.prober is None:
+            self.prober = mine_probability.ProbabilityEngine()
+        self.probabilities = self.prober.analyze(self)
+        return self.probabilities
+
+    def is_complete(self) -> bool:
+        """ 所有非地雷单元格都已点开，由计数器直接判断 """
+        return self.safe_remain == 0
+
+    def scan_complete(self) -> bool:
+        """ 逐个检查所有单元格是否完成，只用于校验计数器 """
+        return all(
+            is_mime or state == UNCOVERED
+            for is_mime, state in zip(self.mines, self.states)
+        )
 
     def draw_board(self, screen, button=0, mouse_x=0, mouse_y=0):
         """ 根据各自状态绘制棋盘中所有单元格 """
         # 绘制背景颜色
         screen.fill(BACK_COLOR)
-
-        def draw_cell(image, cx, cy):
-            screen.blit(image, (cx * self.cell_size, cy * self.cell_size))
-
-        def draw_uncovered_cell(cell):
-            draw_cell("uncovered", cell.x, cell.y)
-            if cell.is_mime and self.game_over:
-                draw_cell("flower", x, y)
-                return
-            mime_count = self.get_surrounding_mime_count(x, y)
-            if mime_count > 0:
-                draw_cell(str(mime_count), x, y)
-
-        # def draw_selected_cell(cell):
-        #     if button != mouse.LEFT:
-        #         draw_cell("covered_highlighted", cell.x, cell.y)
-        #     elif cell.state == "flag":
-        #         draw_cell("covered", cell.x, cell.y)
-        #     else:
-        #         draw_cell("uncovered", cell.x, cell.y)
-
-        # sx, sy = self.get_mouse_loc(mouse_x, mouse_y)
-        # print("mouse:", button, sx, sy)
-
-        # 依次绘制棋盘所有单元格
-        for y in range(self.row_count):
-            for x in range(self.col_count):
-                curr_cell = self.get_cell(x, y)
-                if curr_cell.state == "uncovered":
-                    draw_uncovered_cell(curr_cell)
-                # elif x == sx and y == sy and not self.game_over:
-                #     draw_selected_cell(curr_cell)
-                else:
-                    draw_cell("covered", x, y)
-
-                if curr_cell.state == "flag":
-                    draw_cell("flag", x, y)
-                elif curr_cell.state == "question":
-                    draw_cell("question", x, y)
-
-    def draw_info(self, screen, font, height):
-        # 绘制底部信息
-        text = ""
+        if self.show_hint and (
+                self.changed or self.changed_all or self.probabilities is None
+        ):
+            self.update_probabilities()
+        screen.blit(self.renderer.render(self), (0, 0))
+        if self.show_hint and self.probabilities:
+            hint = self.renderer.render_hint(self, self.probabilities)
+            screen.blit(hint, (0, 0))
+
+    def get_info_text(self) -> str:
+        """ 底部信息栏的文字 """
         if self.game_over:
             if self.mime_remain > 0:
-                text = " Game Over"
-            else:
-                text = " You Win !"
-        elif self.mime_remain > 0:
-            text = f" Remain: {self.mime_remain}"
-        info = font.render(text, True, TEXT_COLOR)
+                return " Game Over"
+            return " You Win !"
+        if self.mime_remain > 0:
+            return f" Remain: {self.mime_remain}"
+        return ""
+
+    def draw_info(self, screen, font=None, height=None):
+        # 绘制底部信息
+        if height is None:
+            height = self.row_count * self.cell_size + 5
+        info = self.renderer.render_info(self.get_info_text(), font)
         screen.blit(info, (0, height))
 
 
 game = MineBoard()
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # python mine.py session.mlog 记录所有操作，可以用mine_replay回放
+    game.record(sys.argv[1])
 TITLE = game.name  # 窗口标题
 WIDTH, HEIGHT = game.screen_size
 
 
 def on_key_down(key):
-    # 按下空格键重置游戏
-    if key == K_SPACE:
-        game.reset()
+    game.on_pressed(key)
 
 
 def on_mouse_up(pos, button):
@@ -241,9 +553,8 @@ def on_mouse_up(pos, button):
 def draw():
     screen.clear()  # 清除屏幕内容
     game.draw_board(screen)
-    font = pygame.font.Font(None, 32)
     height = HEIGHT - INFO_HEIGHT + 5
-    game.draw_info(screen, font, height)
+    game.draw_info(screen, height=height)
 
 
-pgzrun.go()
+board.run_game(__name__)
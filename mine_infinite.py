@@ -0,0 +1,358 @@
+""" 无限扫雷，棋盘按64x64分块，玩家点到或看到时才生成
+
+每块的地雷由(种子, 第一次点击的位置, 块坐标)的哈希决定，随时可以重新生成，
+所以块被淘汰后只需要保存单元格状态；完全没有动过的块什么都不保存。
+方向键或WASD移动视野，空格键重开。
+
+    python mine_infinite.py
+"""
+import hashlib
+import random
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from pgzero.constants import mouse
+from pygame.constants import K_SPACE, K_LEFT, K_RIGHT, K_UP, K_DOWN
+from pygame.constants import K_w, K_a, K_s, K_d
+
+import board
+import mine
+from mine import COVERED, FLAG, UNCOVERED, NEXT_STATE
+from neighbors import count_neighbors
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，缺失时逐个地雷累加
+    np = None
+
+CHUNK_BITS = 6
+CHUNK_SIZE = 1 << CHUNK_BITS  # 每块64x64个单元格
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_CELLS = CHUNK_SIZE * CHUNK_SIZE
+CHUNK_MINES = -(-CHUNK_CELLS // 7)  # 与MineBoard一样，地雷占1/7
+MAX_CHUNKS = 64  # 内存中最多保留的块数
+PAN_STEP = 4
+PAN_KEYS = {
+    K_LEFT: (-1, 0), K_RIGHT: (1, 0), K_UP: (0, -1), K_DOWN: (0, 1),
+    K_a: (-1, 0), K_d: (1, 0), K_w: (0, -1), K_s: (0, 1),
+}
+
+
+@lru_cache(maxsize=4 * MAX_CHUNKS)
+def chunk_layout(seed, origin, cx, cy) -> tuple:
+    """ 块内地雷的序号，第一次点击的单元格和它周围8格不会是地雷 """
+    key = f"{seed}:{origin[0]}:{origin[1]}:{cx}:{cy}".encode()
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    rng = random.Random(int.from_bytes(digest, "little"))
+    exclude = []
+    ox, oy = origin
+    for y in range(oy - 1, oy + 2):
+        for x in range(ox - 1, ox + 2):
+            if x >> CHUNK_BITS == cx and y >> CHUNK_BITS == cy:
+                exclude.append((y & CHUNK_MASK) * CHUNK_SIZE + (x & CHUNK_MASK))
+    return tuple(sorted(mine.sample_indexes(rng, CHUNK_CELLS, CHUNK_MINES,
+                                            exclude)))
+
+
+class Chunk:
+    """ 一块单元格，数组与MineBoard相同，按块内的行编号 """
+    __slots__ = ("mines", "counts", "states")
+
+    def __init__(self, mines, counts, states):
+        self.mines = mines
+        self.counts = counts
+        self.states = states
+
+
+class ChunkField:
+    """ 无限大的扫雷棋盘，只有最近用到的max_chunks块在内存中
+
+    被淘汰的块如果有点开或插旗的单元格，压缩后保存到store中，
+    store可以是任意映射，例如shelve.open(path)可以把状态放到磁盘上。
+    """
+
+    def __init__(self, seed, origin, max_chunks=MAX_CHUNKS, store=None):
+        self.seed = seed
+        self.origin = origin
+        self.max_chunks = max_chunks
+        self.store = {} if store is None else store
+        self.chunks = OrderedDict()
+        self.opened = 0  # 已经点开的单元格数量
+
+    def layout(self, cx, cy) -> tuple:
+        return chunk_layout(self.seed, self.origin, cx, cy)
+
+    def count_mines(self, cx, cy) -> bytearray:
+        """ 块内每个单元格周围的地雷数，边缘需要相邻块的地雷 """
+        if np is not None:
+            # 把周围8块也放进来，与MineBoard一样对错位的切片求和
+            mines = np.zeros((3 * CHUNK_SIZE, 3 * CHUNK_SIZE), dtype=np.uint8)
+            for dy in range(3):
+                for dx in range(3):
+                    layout = self.layout(cx + dx - 1, cy + dy - 1)
+                    ys, xs = np.divmod(np.array(layout), CHUNK_SIZE)
+                    mines[dy * CHUNK_SIZE + ys, dx * CHUNK_SIZE + xs] = 1
+            counts = count_neighbors(
+                mines[CHUNK_SIZE - 1:2 * CHUNK_SIZE + 1,
+                      CHUNK_SIZE - 1:2 * CHUNK_SIZE + 1]
+            )
+            return bytearray(counts.tobytes())
+        counts = bytearray(CHUNK_CELLS)
+        for ny in (cy - 1, cy, cy + 1):
+            for nx in (cx - 1, cx, cx + 1):
+                base_x = (nx - cx) * CHUNK_SIZE
+                base_y = (ny - cy) * CHUNK_SIZE
+                for index in self.layout(nx, ny):
+                    mx = base_x + (index & CHUNK_MASK)
+                    my = base_y + (index >> CHUNK_BITS)
+                    if not (-1 <= mx <= CHUNK_SIZE and -1 <= my <= CHUNK_SIZE):
+                        continue
+                    for y in range(max(my - 1, 0), min(my + 2, CHUNK_SIZE)):
+                        row = y * CHUNK_SIZE
+                        for x in range(max(mx - 1, 0), min(mx + 2, CHUNK_SIZE)):
+                            if x != mx or y != my:
+                                counts[row + x] += 1
+        return counts
+
+    def load_chunk(self, cx, cy) -> Chunk:
+        mines = bytearray(CHUNK_CELLS)
+        for index in self.layout(cx, cy):
+            mines[index] = 1
+        saved = self.store.get(f"{cx},{cy}")
+        if saved is None:
+            states = bytearray(CHUNK_CELLS)
+        else:
+            states = bytearray(zlib.decompress(saved))
+        return Chunk(mines, self.count_mines(cx, cy), states)
+
+    def save_chunk(self, cx, cy, chunk):
+        key = f"{cx},{cy}"
+        if chunk.states.count(COVERED) < CHUNK_CELLS:
+            self.store[key] = zlib.compress(bytes(chunk.states))
+        elif key in self.store:
+            del self.store[key]
+
+    def get_chunk(self, cx, cy) -> Chunk:
+        """ 取出一块，不在内存中时生成或从store恢复，并淘汰最久没用的块 """
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = self.chunks[key] = self.load_chunk(cx, cy)
+        while len(self.chunks) > self.max_chunks:
+            (old_x, old_y), old = self.chunks.popitem(last=False)
+            self.save_chunk(old_x, old_y, old)
+        return chunk
+
+    def locate(self, x, y) -> (Chunk, int):
+        """ 单元格所在的块以及块内序号 """
+        chunk = self.get_chunk(x >> CHUNK_BITS, y >> CHUNK_BITS)
+        return chunk, (y & CHUNK_MASK) * CHUNK_SIZE + (x & CHUNK_MASK)
+
+    def get_state(self, x, y) -> int:
+        chunk, index = self.locate(x, y)
+        return chunk.states[index]
+
+    def is_mime(self, x, y) -> bool:
+        chunk, index = self.locate(x, y)
+        return chunk.mines[index] == 1
+
+    def next_state(self, x, y) -> int:
+        """ 右键点击，切换单元格状态 """
+        chunk, index = self.locate(x, y)
+        state = chunk.states[index]
+        if state != UNCOVERED:
+            state = chunk.states[index] = NEXT_STATE[state]
+        return state
+
+    def uncover(self, x, y):
+        """ 只点开一个单元格，用于点到地雷 """
+        chunk, index = self.locate(x, y)
+        chunk.states[index] = UNCOVERED
+
+    def open_cells(self, stack) -> [(int, int)]:
+        """ 点开单元格，周围没有地雷时继续点开周围的单元格，可以跨越多个块
+
+        与MineBoard.open_more_cells一样，入栈前就标记为点开。
+        每次访问都重新取块，途中被淘汰的块已经保存，不会丢失状态。
+        """
+        opened = []
+        pending = []
+        for x, y in stack:
+            chunk, index = self.locate(x, y)
+            if chunk.states[index] != UNCOVERED:
+                chunk.states[index] = UNCOVERED
+                opened.append((x, y))
+                pending.append((x, y))
+        while pending:
+            x, y = pending.pop()
+            chunk, index = self.locate(x, y)
+            if chunk.counts[index] > 0:
+                continue
+            for ny in (y - 1, y, y + 1):
+                for nx in (x - 1, x, x + 1):
+                    chunk, index = self.locate(nx, ny)
+                    state = chunk.states[index]
+                    if state != UNCOVERED and state != FLAG:
+                        chunk.states[index] = UNCOVERED
+                        opened.append((nx, ny))
+                        pending.append((nx, ny))
+        self.opened += len(opened)
+        return opened
+
+    def close(self):
+        """ 把内存中的块都保存到store """
+        while self.chunks:
+            (cx, cy), chunk = self.chunks.popitem(last=False)
+            self.save_chunk(cx, cy, chunk)
+
+
+class InfiniteMineBoard(board.Board):
+    """ 无限扫雷，屏幕上的棋盘是视野，states等数组是视野内单元格的副本，
+    可以直接使用MineRenderer绘制
+    """
+    name = "无限扫雷"
+    field = None
+    view_x = view_y = 0  # 视野左上角的单元格坐标
+    game_over = False
+    first_click = True
+    mime_seed = None
+    changed_all = True
+
+    def __init__(self, seed=None, max_chunks=MAX_CHUNKS, store=None):
+        self.rng = random.Random(seed)
+        self.max_chunks = max_chunks
+        self.store = store
+        self.renderer = mine.MineRenderer(mine.CELL_SIZE)
+        super().__init__(mine.CELL_SIZE, mine.X_COUNT, mine.Y_COUNT,
+                         mine.INFO_HEIGHT)
+
+    def reset(self):
+        """ 重开游戏，第一次点击时才创建棋盘 """
+        if self.field is not None and self.store is not None:
+            self.store.clear()  # 上一局的状态不再需要
+        self.field = None
+        self.game_over = False
+        self.first_click = True
+        self.mime_seed = None
+        self.view_x = -(self.col_count // 2)
+        self.view_y = -(self.row_count // 2)
+        cell_count = self.col_count * self.row_count
+        self.mines = bytearray(cell_count)
+        self.states = bytearray(cell_count)
+        self.counts = bytearray(cell_count)
+        self.changed = set()
+        self.changed_all = True
+
+    @property
+    def opened(self) -> int:
+        return self.field.opened if self.field is not None else 0
+
+    def refresh_view(self):
+        """ 从棋盘复制视野内的单元格，只把状态变化的单元格交给renderer重画 """
+        if self.field is None:
+            return
+        locate = self.field.locate
+        index = 0
+        for y in range(self.view_y, self.view_y + self.row_count):
+            for x in range(self.view_x, self.view_x + self.col_count):
+                chunk, i = locate(x, y)
+                state = chunk.states[i]
+                if state != self.states[index]:
+                    self.states[index] = state
+                    self.changed.add(index)
+                self.mines[index] = chunk.mines[i]
+                self.counts[index] = chunk.counts[i]
+                index += 1
+
+    def pan(self, dx, dy):
+        """ 移动视野，新进入视野的块这时才生成 """
+        self.view_x += dx
+        self.view_y += dy
+        self.refresh_view()
+        self.changed_all = True
+
+    def on_clicked(self, button, mouse_x, mouse_y):
+        """ 鼠标（包括左、中、右）点击操作 """
+        if self.game_over:
+            self.reset()
+            return
+        sx, sy = self.get_mouse_loc(mouse_x, mouse_y)
+        x, y = self.view_x + sx, self.view_y + sy
+        if self.field is None:
+            if button == mouse.RIGHT:
+                return
+            self.mime_seed = self.rng.getrandbits(64)
+            self.field = ChunkField(
+                self.mime_seed, (x, y), self.max_chunks, self.store
+            )
+            self.first_click = False
+        field = self.field
+        if button == mouse.RIGHT:
+            field.next_state(x, y)
+        elif field.get_state(x, y) == FLAG:
+            return
+        elif field.is_mime(x, y):
+            field.uncover(x, y)
+            self.game_over = True
+            self.changed_all = True
+        else:
+            stack = [(x, y)]
+            if button == mouse.MIDDLE:
+                stack.extend(
+                    (nx, ny) for ny in (y - 1, y, y + 1)
+                    for nx in (x - 1, x, x + 1)
+                    if field.get_state(nx, ny) == COVERED
+                )
+            field.open_cells(stack)
+        self.refresh_view()
+
+    def on_pressed(self, key):
+        """ 键盘操作 """
+        if key == K_SPACE:
+            self.reset()
+        elif key in PAN_KEYS:
+            dx, dy = PAN_KEYS[key]
+            self.pan(dx * PAN_STEP, dy * PAN_STEP)
+
+    def draw_board(self, screen):
+        screen.fill(mine.BACK_COLOR)
+        screen.blit(self.renderer.render(self), (0, 0))
+
+    def get_info_text(self) -> str:
+        """ 底部信息栏的文字 """
+        text = f" Opened: {self.opened}"
+        if self.game_over:
+            return text + "  Game Over"
+        return text
+
+    def draw_info(self, screen, font=None, height=None):
+        if height is None:
+            height = self.row_count * self.cell_size + 5
+        info = self.renderer.render_info(self.get_info_text(), font)
+        screen.blit(info, (0, height))
+
+
+game = InfiniteMineBoard()
+TITLE = game.name  # 窗口标题
+WIDTH, HEIGHT = game.screen_size
+
+
+def on_key_down(key):
+    game.on_pressed(key)
+
+
+def on_mouse_up(pos, button):
+    game.on_clicked(button, *pos)
+
+
+def draw():
+    screen.clear()  # 清除屏幕内容
+    game.draw_board(screen)
+    height = HEIGHT - mine.INFO_HEIGHT + 5
+    game.draw_info(screen, height=height)
+
+
+board.run_game(__name__)
@@ -0,0 +1,113 @@
+""" 扫雷操作日志，二进制格式，只在文件末尾追加
+
+文件头记录棋盘大小和safe_zone，之后每条记录为1字节类型加上固定长度的数据：
+鼠标点击(按键, x, y)、键盘按键、埋雷用的随机数种子，
+以及每局结束和停止记录时棋盘状态的校验值。
+每次打开日志记录时先写一条开始记录，表示之后的操作从全新的棋盘开始，
+同一个文件中可以追加多次记录。
+同样的文件头和记录总是得到同样的棋盘，见mine_replay。
+"""
+import os
+import struct
+import weakref
+
+MAGIC = b"MLOG"
+VERSION = 2  # 版本1没有开始记录，只能包含一次记录
+HEADER = struct.Struct("<4sBHHB")  # MAGIC, 版本, 列数, 行数, safe_zone
+
+CLICK, KEY, SEED, CHECK, START = b"c", b"k", b"s", b"h", b"n"
+RECORDS = {
+    START: struct.Struct("<"),  # 之后的操作从全新的棋盘开始
+    CLICK: struct.Struct("<BHH"),  # 鼠标按键, 鼠标x, 鼠标y
+    KEY: struct.Struct("<I"),  # 按键编码
+    SEED: struct.Struct("<Q"),  # set_mime_cells使用的种子
+    CHECK: struct.Struct("<20s"),  # MineBoard.state_hash()
+}
+
+
+class LogRecorder:
+    """ 把MineBoard的操作追加到日志文件
+
+    文件已经存在时检查文件头是否与棋盘一致，继续在末尾追加，
+    每次都先写入开始记录。
+    写入有缓冲，程序退出或close()时写到磁盘。
+    """
+
+    def __init__(self, path, col_count, row_count, safe_zone=False):
+        header = HEADER.pack(
+            MAGIC, VERSION, col_count, row_count, int(safe_zone)
+        )
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(HEADER.size) != header:
+                    raise ValueError(
+                        f"Log {path!r} is for a different board or version"
+                    )
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "ab")
+            self.file.write(header)
+        self.last_tag = None
+        self.write(START)
+        self.finalizer = weakref.finalize(self, self.file.close)
+
+    def write(self, tag, *values):
+        self.file.write(tag + RECORDS[tag].pack(*values))
+        self.last_tag = tag
+
+    def click(self, button, mouse_x, mouse_y):
+        self.write(CLICK, int(button), mouse_x, mouse_y)
+
+    def key(self, key):
+        self.write(KEY, int(key))
+
+    def seed(self, seed):
+        self.write(SEED, seed)
+
+    def check(self, digest):
+        self.write(CHECK, digest)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self, digest=None):
+        """ 关闭日志，给出digest时先写入最后的棋盘状态，刚写过校验值则不重复 """
+        if digest is not None and self.finalizer.alive:
+            if self.last_tag != CHECK:
+                self.check(digest)
+        self.finalizer()
+
+
+def read_header(data) -> (int, int, bool):
+    """ 返回日志中棋盘的列数、行数和safe_zone """
+    if len(data) < HEADER.size:
+        raise ValueError("Log is too short")
+    magic, version, col_count, row_count, safe_zone = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a mine log")
+    if version not in (1, VERSION):
+        raise ValueError(f"Unsupported log version {version}")
+    return col_count, row_count, bool(safe_zone)
+
+
+def iter_records(data):
+    """ 依次返回文件头之后的(类型, 数据)，末尾不完整的记录被忽略 """
+    offset = HEADER.size
+    size = len(data)
+    while offset < size:
+        tag = data[offset:offset + 1]
+        record = RECORDS.get(tag)
+        if record is None:
+            raise ValueError(f"Unknown record {tag!r} at offset {offset}")
+        offset += 1
+        if offset + record.size > size:
+            return  # 写到一半时程序退出
+        yield tag, record.unpack_from(data, offset)
+        offset += record.size
+
+
+def read_log(path) -> ((int, int, bool), list):
+    """ 读出整个日志，返回文件头和所有记录 """
+    with open(path, "rb") as f:
+        data = f.read()
+    return read_header(data), list(iter_records(data))
@@ -0,0 +1,454 @@
+""" 扫雷地雷概率计算，用于提示和分析
+
+把边界（与数字格相邻的未点开单元格）按共享的数字格分成互不相关的连通块，
+小的连通块精确枚举，大的用蒙特卡罗抽样估计，抽样可以分给多个进程；
+最后结合剩余的地雷总数，算出每个未点开单元格是地雷的概率。
+
+    python mine_probability.py --width 30 --height 16 --mines 99
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import board
+
+EXACT_STATES = 100000  # 精确枚举时最多保存的中间状态数，超过后改用抽样
+SAMPLES = 20000  # 每个需要抽样的连通块总共的抽样次数
+MIN_CHOICE = 0.05  # 抽样时选择某个值的最小概率，避免权重过大
+
+
+class TooManyStates(Exception):
+    """ 精确枚举的中间状态超过上限 """
+
+
+class Component:
+    """ 一组互相关联的边界单元格及其约束
+
+    单元格按广度优先的顺序编号为0到size-1，相关的约束在编号上比较接近；
+    constraints中每一项为(单元格编号的元组, 地雷数)。
+    """
+
+    def __init__(self, cells, constraints):
+        self.cells = cells  # 编号对应的棋盘单元格序号
+        self.size = len(cells)
+        self.constraints = constraints
+        # touching[i]: 包含单元格i的约束，以及该约束在i之后还有几个单元格
+        self.touching = [[] for _ in range(self.size)]
+        # active[i]: 在i之前已经开始、到i还没有结束的约束
+        self.active = [[] for _ in range(self.size + 1)]
+        for c, (positions, _) in enumerate(constraints):
+            for rest, i in enumerate(sorted(positions, reverse=True)):
+                self.touching[i].append((c, rest))
+            for i in range(min(positions) + 1, max(positions) + 1):
+                self.active[i].append(c)
+        self.active = [tuple(active) for active in self.active]
+
+    @property
+    def initial(self) -> [int]:
+        return [mines for _, mines in self.constraints]
+
+
+def breadth_first(start, cell_constraints, constraints) -> ([int], set):
+    """ 从start开始广度优先遍历，返回单元格的顺序和用到的约束 """
+    order, visited, used = [start], {start}, set()
+    for cell in order:  # order在遍历时增长
+        for c in cell_constraints[cell]:
+            if c in used:
+                continue
+            used.add(c)
+            for other in constraints[c][0]:
+                if other not in visited:
+                    visited.add(other)
+                    order.append(other)
+    return order, used
+
+
+def split_components(constraints) -> [Component]:
+    """ 共享未点开单元格的约束属于同一个连通块
+
+    边界通常是细长的一条，从一端开始遍历时同时未结束的约束最少，
+    所以再从第一次遍历最后到达的单元格重新遍历一次。
+    """
+    cell_constraints = {}
+    for c, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            cell_constraints.setdefault(cell, []).append(c)
+    components = []
+    visited = set()
+    for start in cell_constraints:
+        if start in visited:
+            continue
+        order, used = breadth_first(start, cell_constraints, constraints)
+        visited.update(order)
+        order, _ = breadth_first(order[-1], cell_constraints, constraints)
+        positions = {cell: i for i, cell in enumerate(order)}
+        components.append(Component(order, [
+            (tuple(positions[cell] for cell in constraints[c][0]),
+             constraints[c][1])
+            for c in sorted(used)
+        ]))
+    return components
+
+
+def enumerate_component(comp, max_states=EXACT_STATES) -> (dict, dict):
+    """ 精确统计连通块的所有解
+
+    按编号逐个决定单元格是否地雷，状态只需记录还没结束的约束剩余的地雷数，
+    相同状态的部分解合并计数。先正向统计到达每个状态的方式数，
+    再反向统计每个状态之后的方式数，两者相乘得到每个单元格是地雷的解数。
+    返回totals {地雷数: 解数} 和 mines {地雷数: [每个单元格是地雷的解数]}
+    """
+    size, initial = comp.size, comp.initial
+    layers = [{(): {0: 1}}]  # layers[i]: 状态 -> {已有地雷数: 方式数}
+    edges = []  # edges[i]: 单元格i的所有(状态, 取值, 下一状态)
+    states = 1
+    for i in range(size):
+        active, following = comp.active[i], comp.active[i + 1]
+        layer, layer_edges = {}, []
+        for key, counts in layers[i].items():
+            remaining = dict(zip(active, key))
+            for value in (0, 1):
+                after = {}
+                for c, rest in comp.touching[i]:
+                    left = remaining.get(c, initial[c]) - value
+                    if left < 0 or left > rest:
+                        break
+                    after[c] = left
+                else:
+                    next_key = tuple(
+                        after[c] if c in after else remaining[c]
+                        for c in following
+                    )
+                    target = layer.get(next_key)
+                    if target is None:
+                        states += 1
+                        if states > max_states:
+                            raise TooManyStates(states)
+                        target = layer[next_key] = {}
+                    for k, count in counts.items():
+                        target[k + value] = target.get(k + value, 0) + count
+                    layer_edges.append((key, value, next_key))
+        layers.append(layer)
+        edges.append(layer_edges)
+
+    totals = layers[size].get((), {})
+    mines = {k: [0] * size for k in totals}
+    backward = {(): {0: 1}}  # 状态 -> {之后的地雷数: 方式数}
+    for i in range(size - 1, -1, -1):
+        current = {}
+        for key, value, next_key in edges[i]:
+            after = backward.get(next_key)
+            if not after:
+                continue
+            target = current.setdefault(key, {})
+            for k, count in after.items():
+                target[k + value] = target.get(k + value, 0) + count
+            if value:
+                for a, before in layers[i][key].items():
+                    for b, count in after.items():
+                        mines[a + b + 1][i] += before * count
+        backward = current
+    return totals, mines
+
+
+def sample_component(comp, samples, seed) -> (float, dict, dict):
+    """ 用抽样估计连通块的解数
+
+    每次按编号随机决定单元格的取值，取值的概率参考相关约束剩余的地雷密度，
+    解的权重为各步选择概率的倒数（Knuth估计），加权和是解数的无偏估计。
+    权重可能非常大，返回(scale, totals, mines)，实际数值还要乘以exp(scale)。
+    """
+    rng = random.Random(seed)
+    initial = comp.initial
+    scale = None
+    totals, mines = {}, {}
+    for _ in range(samples):
+        remaining = list(initial)
+        log_weight = 0.0
+        chosen = []
+        for i, touching in enumerate(comp.touching):
+            can_empty = can_mine = True
+            density = 0.0
+            for c, rest in touching:
+                left = remaining[c]
+                can_empty = can_empty and left <= rest
+                can_mine = can_mine and 0 < left <= rest + 1
+                density += left / (rest + 1)
+            if can_empty and can_mine:
+                p = density / len(touching)
+                p = min(max(p, MIN_CHOICE), 1 - MIN_CHOICE)
+                if rng.random() < p:
+                    log_weight -= math.log(p)
+                else:
+                    log_weight -= math.log(1 - p)
+                    continue
+            elif not can_mine:
+                if not can_empty:
+                    break  # 死路，这次抽样的权重为0
+                continue
+            chosen.append(i)
+            for c, _ in touching:
+                remaining[c] -= 1
+        else:
+            if scale is None or log_weight > scale:
+                # 以目前最大的权重为基准，避免浮点数溢出
+                if scale is not None:
+                    factor = math.exp(scale - log_weight)
+                    for k in totals:
+                        totals[k] *= factor
+                        mines[k] = [m * factor for m in mines[k]]
+                scale = log_weight
+            weight = math.exp(log_weight - scale)
+            k = len(chosen)
+            if k not in totals:
+                totals[k] = 0.0
+                mines[k] = [0.0] * comp.size
+            totals[k] += weight
+            cell_mines = mines[k]
+            for i in chosen:
+                cell_mines[i] += weight
+    return scale, totals, mines
+
+
+def merge_samples(results) -> (dict, dict):
+    """ 合并多次sample_component的结果，统一到同一个基准 """
+    results = [result for result in results if result[0] is not None]
+    totals, mines = {}, {}
+    if not results:
+        return totals, mines
+    scale = max(result[0] for result in results)
+    for part_scale, part_totals, part_mines in results:
+        factor = math.exp(part_scale - scale)
+        for k, total in part_totals.items():
+            totals[k] = totals.get(k, 0.0) + total * factor
+            cell_mines = mines.setdefault(k, [0.0] * len(part_mines[k]))
+            for i, m in enumerate(part_mines[k]):
+                cell_mines[i] += m * factor
+    return totals, mines
+
+
+def normalize(totals, mines) -> (dict, dict):
+    """ 除以最大的解数转为浮点数，精确枚举的大整数不会溢出 """
+    top = max(totals.values())
+    return (
+        {k: total / top for k, total in totals.items()},
+        {k: [m / top for m in mines[k]] for k in mines},
+    )
+
+
+def convolve(a, b) -> dict:
+    """ 两个{地雷数: 权重}分布的卷积 """
+    result = {}
+    for i, x in a.items():
+        for j, y in b.items():
+            result[i + j] = result.get(i + j, 0.0) + x * y
+    return result
+
+
+def log_comb(n, k) -> float:
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+class ProbabilityEngine:
+    """ 计算每个未点开单元格是地雷的概率
+
+    只使用玩家能看到的信息（见MineBoard.get_constraints），
+    需要抽样的连通块较多时分给workers个进程，进程池在第一次需要时才创建。
+    """
+
+    def __init__(self, workers=None, samples=SAMPLES,
+                 max_states=EXACT_STATES, seed=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.samples = samples
+        self.max_states = max_states
+        self.rng = random.Random(seed)
+        self.executor = None
+        self.exact_count = self.sampled_count = 0  # 最近一次计算的连通块数
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+            self.finalizer = weakref.finalize(
+                self, self.executor.shutdown, cancel_futures=True
+            )
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.finalizer()
+            self.executor = None
+
+    def analyze(self, board) -> {int: float}:
+        """ 计算棋盘上的概率，游戏结束后返回空字典 """
+        if board.game_over:
+            return {}
+        return self.solve(*board.get_constraints())
+
+    def solve(self, unknown, constraints, mine_count) -> {int: float}:
+        """ unknown为所有未点开的单元格，constraints为[(单元格序号, 地雷数)]，
+        mine_count为这些单元格中的地雷总数。约束互相矛盾时返回空字典
+        """
+        components = split_components(constraints)
+        tables, sampled = [], []
+        for comp in components:
+            try:
+                tables.append(enumerate_component(comp, self.max_states))
+            except TooManyStates:
+                sampled.append(len(tables))
+                tables.append(None)
+        if sampled:
+            results = self.sample([components[n] for n in sampled])
+            for n, result in zip(sampled, results):
+                tables[n] = result
+        self.exact_count = len(components) - len(sampled)
+        self.sampled_count = len(sampled)
+        if any(not totals for totals, _ in tables):
+            return {}
+        tables = [normalize(totals, mines) for totals, mines in tables]
+
+        frontier = sum(comp.size for comp in components)
+        rest = len(unknown) - frontier  # 不与数字格相邻的单元格
+        # 剩余地雷在其他单元格中任意分布的方式数，取对数后减去最大值
+        logs = {
+            m: log_comb(rest, m) for m in range(max(mine_count - frontier, 0),
+                                                min(mine_count, rest) + 1)
+        }
+        if not logs:
+            return {}
+        top = max(logs.values())
+        spread = {m: math.exp(value - top) for m, value in logs.items()}
+
+        # prefix[n]为前n个连通块的卷积，suffix[n]为第n个之后的卷积
+        prefix = [{0: 1.0}]
+        for totals, _ in tables:
+            prefix.append(convolve(prefix[-1], totals))
+        suffix = [{0: 1.0}]
+        for totals, _ in reversed(tables):
+            suffix.append(convolve(suffix[-1], totals))
+        suffix.reverse()
+
+        probabilities = {}
+        weight = {
+            s: w * spread[mine_count - s] for s, w in prefix[-1].items()
+            if mine_count - s in spread
+        }
+        z = sum(weight.values())
+        if z <= 0:
+            return {}
+        if rest:
+            p = sum(w * (mine_count - s) for s, w in weight.items()) / rest / z
+            frontier_cells = set()
+            for comp in components:
+                frontier_cells.update(comp.cells)
+            for index in unknown:
+                if index not in frontier_cells:
+                    probabilities[index] = p
+        for n, (comp, (totals, mines)) in enumerate(zip(components, tables)):
+            others = convolve(prefix[n], suffix[n + 1])
+            cell_weights = [0.0] * comp.size
+            for k, cell_mines in mines.items():
+                factor = sum(
+                    w * spread[mine_count - k - s] for s, w in others.items()
+                    if mine_count - k - s in spread
+                )
+                if factor:
+                    for i, m in enumerate(cell_mines):
+                        cell_weights[i] += m * factor
+            for cell, w in zip(comp.cells, cell_weights):
+                probabilities[cell] = min(w / z, 1.0)
+        return probabilities
+
+    def sample(self, components) -> [(dict, dict)]:
+        """ 每个连通块的抽样分成workers份，可以在多个进程中同时进行 """
+        chunks = self.workers
+        count = max(1, math.ceil(self.samples / chunks))
+        jobs = [
+            (comp, count, self.rng.getrandbits(64))
+            for comp in components for _ in range(chunks)
+        ]
+        if self.workers <= 1:
+            results = [sample_component(*job) for job in jobs]
+        else:
+            results = list(self.get_executor().map(sample_component, *zip(*jobs)))
+        return [
+            merge_samples(results[n * chunks:(n + 1) * chunks])
+            for n in range(len(components))
+        ]
+
+
+def random_position(rng, col_count, row_count, mine_count, opened):
+    """ 随机埋雷后从中间点开，再随机点开一些安全的格子，返回玩家可见的信息 """
+    neighbors = board.NeighborTable(col_count, row_count).neighbors
+    cell_count = col_count * row_count
+    start = row_count // 2 * col_count + col_count // 2
+    exclude = {start, *neighbors(start)}
+    mines = set(rng.sample(
+        [i for i in range(cell_count) if i not in exclude], mine_count
+    ))
+    counts = [
+        sum(i in mines for i in neighbors(index))
+        for index in range(cell_count)
+    ]
+    uncovered = set()
+    safe = [i for i in range(cell_count) if i not in mines]
+    for index in [start] + rng.sample(safe, opened):
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            if index in uncovered:
+                continue
+            uncovered.add(index)
+            if counts[index] == 0:
+                stack.extend(neighbors(index))
+    unknown = [i for i in range(cell_count) if i not in uncovered]
+    constraints = []
+    for index in uncovered:
+        cells = tuple(
+            i for i in neighbors(index) if i not in uncovered
+        )
+        if cells:
+            constraints.append((cells, counts[index]))
+    return unknown, constraints, mine_count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="扫雷地雷概率计算耗时")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=16)
+    parser.add_argument("--mines", type=int, default=99)
+    parser.add_argument("--opened", type=int, default=10,
+                        help="除第一次点击外随机点开的安全格数")
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    engine = ProbabilityEngine(args.workers, seed=args.seed)
+    engine.get_executor()  # 进程池的启动时间不计入
+    elapsed = []
+    exact = sampled = 0
+    for _ in range(args.positions):
+        position = random_position(
+            rng, args.width, args.height, args.mines, args.opened
+        )
+        started = time.perf_counter()
+        engine.solve(*position)
+        elapsed.append(time.perf_counter() - started)
+        exact += engine.exact_count
+        sampled += engine.sampled_count
+    engine.close()
+    elapsed.sort()
+    print(f"board:      {args.width}x{args.height}, {args.mines} mines")
+    print(f"components: {exact} exact, {sampled} sampled")
+    print(f"median:     {elapsed[len(elapsed) // 2] * 1000:.1f} ms")
+    print(f"max:        {elapsed[-1] * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
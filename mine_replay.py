@@ -0,0 +1,174 @@
+""" 扫雷日志回放，不打开窗口也不绘制，用于调试、性能分析和批量校验
+
+    python mine.py session.mlog  # 玩的同时记录日志
+    python mine_replay.py generate logs --count 1000 --seed 1
+    python mine_replay.py verify logs/*.mlog --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pgzero.constants import mouse
+from pygame.constants import K_SPACE
+
+import mine
+import mine_log
+
+
+class ReplayBoard(mine.MineBoard):
+    """ 埋雷时依次使用日志中记录的种子 """
+
+    def __init__(self, col_count, row_count, safe_zone=False, seeds=()):
+        self.seeds = deque(seeds)
+        super().__init__(safe_zone=safe_zone)
+        if (col_count, row_count) != (self.col_count, self.row_count):
+            self.resize(col_count, row_count)
+
+    def set_mime_cells(self, sx=-1, sy=-1, seed=None):
+        if seed is None:
+            if not self.seeds:
+                raise ValueError("No seed left in the log")
+            seed = self.seeds.popleft()
+        super().set_mime_cells(sx, sy, seed)
+
+
+def replay(path) -> dict:
+    """ 按顺序重新执行日志中的操作，校验每局结束时的棋盘状态
+
+    每条开始记录之后换一个全新的棋盘，接着使用还没用到的种子。
+    """
+    (col_count, row_count, safe_zone), records = mine_log.read_log(path)
+    seeds = [values[0] for tag, values in records if tag == mine_log.SEED]
+    board = ReplayBoard(col_count, row_count, safe_zone, seeds)
+    events = checks = 0
+    mismatches = []  # 校验失败的记录序号
+    started = time.perf_counter()
+    for number, (tag, values) in enumerate(records):
+        if tag == mine_log.START:
+            board = ReplayBoard(col_count, row_count, safe_zone, board.seeds)
+        elif tag == mine_log.CLICK:
+            board.on_clicked(*values)
+            events += 1
+        elif tag == mine_log.KEY:
+            board.on_pressed(values[0])
+            events += 1
+        elif tag == mine_log.CHECK:
+            checks += 1
+            if values[0] != board.state_hash():
+                mismatches.append(number)
+    return {
+        "path": path,
+        "events": events,
+        "checks": checks,
+        "mismatches": mismatches,
+        "seconds": time.perf_counter() - started,
+        "state_hash": board.state_hash().hex(),
+    }
+
+
+def verify_logs(paths, workers=None):
+    """ 回放多个日志，workers大于1时分给多个进程，按paths的顺序返回结果 """
+    if workers is not None and workers <= 1:
+        yield from map(replay, paths)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(replay, paths, chunksize=16)
+
+
+def play_session(path, games, seed=None, col_count=None, row_count=None,
+                 safe_zone=False):
+    """ 随机点击下games局并记录日志，用于生成测试数据 """
+    rng = random.Random(seed)
+    board = mine.MineBoard(seed=rng.getrandbits(64), safe_zone=safe_zone)
+    if col_count or row_count:
+        board.resize(col_count or board.col_count, row_count or board.row_count)
+    board.record(path)
+    size = board.cell_size
+    finished = 0
+    while finished < games:
+        if board.game_over:
+            finished += 1
+            board.on_clicked(mouse.LEFT, 0, 0)  # 结束后点击任意位置重开
+            continue
+        if rng.random() < 0.001:
+            board.on_pressed(K_SPACE)
+            continue
+        # 尽量点未点开的单元格
+        for _ in range(8):
+            index = rng.randrange(len(board.states))
+            if board.states[index] != mine.UNCOVERED:
+                break
+        x, y = board.get_position(index)
+        choice = rng.random()
+        if choice < 0.1:
+            button = mouse.RIGHT
+        elif choice < 0.12:
+            button = mouse.MIDDLE
+        else:
+            button = mouse.LEFT
+        board.on_clicked(button, x * size + size // 2, y * size + size // 2)
+    board.stop_recording()
+
+
+def generate(args) -> int:
+    os.makedirs(args.directory, exist_ok=True)
+    rng = random.Random(args.seed)
+    for n in range(args.count):
+        path = os.path.join(args.directory, f"session{n:05d}.mlog")
+        play_session(path, args.games, rng.getrandbits(64),
+                     args.width, args.height, args.safe_zone)
+    print(f"{args.count} logs written to {args.directory}")
+    return 0
+
+
+def verify(args) -> int:
+    started = time.perf_counter()
+    logs = events = checks = 0
+    replay_seconds = 0.0
+    failures = []
+    for result in verify_logs(args.paths, args.workers):
+        logs += 1
+        events += result["events"]
+        checks += result["checks"]
+        replay_seconds += result["seconds"]
+        if result["mismatches"]:
+            failures.append(result["path"])
+    elapsed = time.perf_counter() - started
+    for path in failures:
+        print(f"MISMATCH {path}")
+    print(f"logs:     {logs} ({len(failures)} failed)")
+    print(f"events:   {events}, checks: {checks}")
+    if replay_seconds:
+        print(f"events/s: {events / replay_seconds:.0f} per process")
+    print(f"elapsed:  {elapsed:.3f}s")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="扫雷日志回放")
+    commands = parser.add_subparsers(dest="command", required=True)
+    parser_generate = commands.add_parser("generate", help="随机对局生成日志")
+    parser_generate.add_argument("directory")
+    parser_generate.add_argument("--count", type=int, default=100,
+                                 help="日志文件个数")
+    parser_generate.add_argument("--games", type=int, default=10,
+                                 help="每个日志中的局数")
+    parser_generate.add_argument("--seed", type=int, default=None)
+    parser_generate.add_argument("--width", type=int, default=None)
+    parser_generate.add_argument("--height", type=int, default=None)
+    parser_generate.add_argument("--safe-zone", action="store_true")
+    parser_verify = commands.add_parser("verify", help="回放并校验日志")
+    parser_verify.add_argument("paths", nargs="+")
+    parser_verify.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        return generate(args)
+    return verify(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
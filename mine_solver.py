@@ -0,0 +1,239 @@
+""" 扫雷自动求解，用于大批量对局统计埋雷是否公平
+
+    python mine_solver.py --games 10000 --seed 1
+"""
+import argparse
+import random
+import sys
+import time
+
+from pgzero.constants import mouse
+
+import mine
+
+
+class MineSolver:
+    """ 约束传播求解器，直接操作MineBoard，不需要窗口
+
+    先用单格规则：数字减去周围旗子数等于0则周围未知格都安全，
+    等于未知格数量则都是地雷；没有进展时再用子集规则比较两个数字格；
+    仍然没有进展才按估计的地雷概率猜一格。
+    只重新检查状态变化的单元格周围的数字格，不会每一步都扫描整个棋盘。
+    """
+
+    def __init__(self, board, rng=None):
+        self.board = board
+        self.rng = rng or random.Random()
+        self.frontier = set()  # 周围还有未知格的数字格
+        self.todo = set()  # 需要重新检查单格规则的数字格
+        self.guesses = 0
+        self.lost = False
+
+    def new_game(self):
+        """ 棋盘已经重开，清空求解状态 """
+        self.frontier = set()
+        self.todo = set()
+        self.guesses = 0
+        self.lost = False
+
+    def is_unknown(self, index) -> bool:
+        state = self.board.states[index]
+        return state == mine.COVERED or state == mine.QUESTION
+
+    def get_constraint(self, index) -> (set, int):
+        """ 数字格周围的未知格，以及其中还剩几个地雷 """
+        board = self.board
+        unknown = set()
+        mines = board.counts[index]
+        for i in board.get_neighbor_indexes(index):
+            state = board.states[i]
+            if state == mine.FLAG:
+                mines -= 1
+            elif state != mine.UNCOVERED:
+                unknown.add(i)
+        return unknown, mines
+
+    def touch(self, index):
+        """ 单元格状态变化后，周围的数字格需要重新检查 """
+        board = self.board
+        for i in board.get_neighbor_indexes(index):
+            if board.states[i] == mine.UNCOVERED and board.counts[i] > 0:
+                self.todo.add(i)
+
+    def open(self, index):
+        """ 点开一格，记录新出现的数字格 """
+        board = self.board
+        x, y = board.get_position(index)
+        opened = board.click_cell(mouse.LEFT, x, y) or []
+        if board.game_over and not board.is_complete():
+            self.lost = True
+            return
+        for i in opened:
+            if board.counts[i] > 0:
+                self.frontier.add(i)
+                self.todo.add(i)
+            self.touch(i)
+
+    def flag(self, index):
+        """ 给确定的地雷插旗 """
+        board = self.board
+        x, y = board.get_position(index)
+        board.click_cell(mouse.RIGHT, x, y)
+        self.touch(index)
+
+    def apply(self, safe, mines) -> bool:
+        """ 执行推理结果，返回是否有进展 """
+        for index in mines:
+            if self.is_unknown(index):
+                self.flag(index)
+        for index in safe:
+            if self.lost or self.board.game_over:
+                break
+            if self.is_unknown(index):
+                self.open(index)
+        return bool(safe or mines)
+
+    def single_rule(self) -> bool:
+        """ 单格规则，直到todo为空，返回是否有进展 """
+        progress = False
+        while self.todo and not self.finished:
+            index = self.todo.pop()
+            unknown, mines = self.get_constraint(index)
+            if not unknown:
+                self.frontier.discard(index)
+            elif mines == 0:
+                progress |= self.apply(unknown, ())
+            elif mines == len(unknown):
+                progress |= self.apply((), unknown)
+        return progress
+
+    def subset_rule(self) -> bool:
+        """ 子集规则：A的未知格包含于B时，差集中的地雷数为两者之差 """
+        constraints = {}
+        for index in list(self.frontier):
+            unknown, mines = self.get_constraint(index)
+            if unknown:
+                constraints[index] = (frozenset(unknown), mines)
+            else:
+                self.frontier.discard(index)
+        board = self.board
+        for a, (unknown_a, mines_a) in constraints.items():
+            # 与A共享未知格的数字格，最远相距2格
+            nearby = {
+                b for i in unknown_a for b in board.get_neighbor_indexes(i)
+                if b != a and b in constraints
+            }
+            for b in nearby:
+                unknown_b, mines_b = constraints[b]
+                if not unknown_a < unknown_b:
+                    continue
+                rest, mines = unknown_b - unknown_a, mines_b - mines_a
+                if mines == 0:
+                    return self.apply(rest, ())
+                if mines == len(rest):
+                    return self.apply((), rest)
+        return False
+
+    def guess(self):
+        """ 估计每个未知格是地雷的概率，点开概率最小的一格 """
+        board = self.board
+        self.guesses += 1
+        probability = {}
+        for index in self.frontier:
+            unknown, mines = self.get_constraint(index)
+            if not unknown:
+                continue
+            p = mines / len(unknown)
+            for i in unknown:
+                probability[i] = max(probability.get(i, 0), p)
+        # 不靠近任何数字格的未知格按剩余的平均密度估计
+        unknown_count = board.safe_remain + board.mime_remain
+        rest_count = unknown_count - len(probability)
+        if rest_count > 0:
+            density = max(board.mime_remain, 0) / unknown_count
+            if not probability or density < min(probability.values()):
+                index = self.pick_unconstrained(probability)
+                if index is not None:
+                    return self.open(index)
+        best = min(probability.values())
+        candidates = [i for i, p in probability.items() if p == best]
+        self.open(self.rng.choice(candidates))
+
+    def pick_unconstrained(self, constrained):
+        """ 随机找一个不靠近数字格的未知格，先随机试几次，再按顺序查找 """
+        board = self.board
+        cell_count = len(board.states)
+        for _ in range(32):
+            index = self.rng.randrange(cell_count)
+            if self.is_unknown(index) and index not in constrained:
+                return index
+        for index in range(cell_count):
+            if self.is_unknown(index) and index not in constrained:
+                return index
+        return None
+
+    @property
+    def finished(self) -> bool:
+        return self.lost or self.board.game_over or self.board.is_complete()
+
+    def play(self, first_x=None, first_y=None) -> bool:
+        """ 在已经重开的棋盘上下完一局，返回是否胜利 """
+        board = self.board
+        self.new_game()
+        if first_x is None:
+            first_x, first_y = board.col_count // 2, board.row_count // 2
+        self.open(board.get_index(first_x, first_y))
+        while not self.finished:
+            if self.single_rule() or self.finished:
+                continue
+            if self.subset_rule() or self.finished:
+                continue
+            self.guess()
+        return not self.lost and board.is_complete()
+
+
+def run_batch(games, seed=None, col_count=None, row_count=None,
+              safe_zone=False) -> dict:
+    """ 连续下games局，返回胜率、每局猜测次数和每秒局数 """
+    board = mine.MineBoard(seed=seed, safe_zone=safe_zone)
+    if col_count or row_count:
+        board.resize(col_count or board.col_count, row_count or board.row_count)
+    solver = MineSolver(board, random.Random(seed))
+    wins = guesses = 0
+    started = time.perf_counter()
+    for _ in range(games):
+        board.reset()
+        wins += solver.play()
+        guesses += solver.guesses
+    elapsed = time.perf_counter() - started
+    return {
+        "games": games,
+        "wins": wins,
+        "win_rate": wins / games if games else 0,
+        "guesses_per_game": guesses / games if games else 0,
+        "games_per_second": games / elapsed if elapsed else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="扫雷自动求解统计")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--width", type=int, default=None)
+    parser.add_argument("--height", type=int, default=None)
+    parser.add_argument("--safe-zone", action="store_true",
+                        help="第一次点击的周围8格也不埋雷")
+    args = parser.parse_args(argv)
+    result = run_batch(
+        args.games, args.seed, args.width, args.height, args.safe_zone
+    )
+    print(f"games:        {result['games']}")
+    print(f"win rate:     {result['win_rate']:.2%}")
+    print(f"guesses/game: {result['guesses_per_game']:.3f}")
+    if result["games_per_second"] is not None:
+        print(f"games/s:      {result['games_per_second']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+""" numpy数组上的邻居计数，细胞演化和扫雷共用
+
+padded比结果多一圈边框，把8个方向错位的切片相加，
+结果的(y, x)就是padded中(y + 1, x + 1)周围8格之和。
+"""
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，调用方在缺失时使用纯Python实现
+    np = None
+
+
+def count_neighbors(padded, out=None):
+    """ 8个方向错位的切片相加，可以写入预先分配的out """
+    p = padded
+    n = np.add(p[:-2, :-2], p[:-2, 1:-1], out=out)
+    n += p[:-2, 2:]
+    n += p[1:-1, :-2]
+    n += p[1:-1, 2:]
+    n += p[2:, :-2]
+    n += p[2:, 1:-1]
+    n += p[2:, 2:]
+    return n
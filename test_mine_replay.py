@@ -0,0 +1,69 @@
+""" 扫雷日志回放的测试
+
+    python -m pytest test_mine_replay.py
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from pgzero.constants import mouse  # noqa: E402
+
+import mine  # noqa: E402
+import mine_log  # noqa: E402
+import mine_replay  # noqa: E402
+
+
+def click_covered(board, count):
+    """ 依次左键点击还没点开的单元格，游戏结束时停下 """
+    size = board.cell_size
+    for _ in range(count):
+        if board.game_over:
+            return
+        index = board.states.index(mine.COVERED)
+        x, y = board.get_position(index)
+        board.on_clicked(mouse.LEFT, x * size + 1, y * size + 1)
+
+
+def test_replay_single_session(tmp_path):
+    path = str(tmp_path / "single.mlog")
+    mine_replay.play_session(path, games=3, seed=1)
+    result = mine_replay.replay(path)
+    assert result["checks"] >= 3
+    assert result["mismatches"] == []
+
+
+def test_replay_two_sessions(tmp_path):
+    path = str(tmp_path / "two.mlog")
+    # 第一次记录停在一局中间，第二次记录追加到同一个文件
+    first = mine.MineBoard(seed=5)
+    first.record(path)
+    click_covered(first, 1)
+    first.on_clicked(mouse.RIGHT, 100, 100)
+    assert not first.game_over
+    first_hash = first.state_hash()
+    first.stop_recording()
+
+    second = mine.MineBoard(seed=6)
+    second.record(path)
+    click_covered(second, 3)
+    second_hash = second.state_hash()
+    second.stop_recording()
+
+    _, records = mine_log.read_log(path)
+    assert [tag for tag, _ in records].count(mine_log.START) == 2
+    result = mine_replay.replay(path)
+    assert result["mismatches"] == []
+    assert result["checks"] >= 2
+    assert result["state_hash"] == second_hash.hex()
+    assert first_hash != second_hash
+
+
+def test_append_rejects_other_board(tmp_path):
+    path = str(tmp_path / "other.mlog")
+    mine_log.LogRecorder(path, 10, 10).close()
+    try:
+        mine_log.LogRecorder(path, 12, 10)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("appended to a log of another board size")